@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib import admin
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'args', 'status', 'attempts', 'run_at',
+                    'last_error')
+    list_filter = ('status', 'name')
+    empty_value_display = settings.EMPTY_VALUE
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        for task in queryset.filter(status=Task.FAILED):
+            try:
+                with transaction.atomic():
+                    Task.objects.filter(id=task.id).update(
+                        status=Task.PENDING, attempts=0,
+                        run_at=timezone.now())
+            except IntegrityError:
+                # Такая же задача уже ждёт выполнения.
+                task.delete()
+        self.message_user(request, 'Задачи поставлены в очередь заново.')
+    retry.short_description = 'Повторить невыполненные задачи'
+
+
+admin.site.register(Task, TaskAdmin)
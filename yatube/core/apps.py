@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import sqlite  # noqa: F401
+        # Модули tasks.py приложений регистрируют фоновые задачи.
+        autodiscover_modules('tasks')
@@ -0,0 +1,189 @@
+"""
+ASGI-приложение поверх WSGI-обработчика Django.
+
+В Django 2.2 нет ни ASGI-обработчика, ни асинхронных представлений и
+ORM, поэтому представления по-прежнему работают в потоках, но потоков
+ограниченное число (ASGI_THREADS), и заняты они только самой работой
+Django. Тело запроса читается, а ответ отправляется в цикле событий:
+медленный клиент держит корутину, а не поток, и один процесс
+обслуживает намного больше одновременных медленных соединений.
+
+Ответ читается и закрывается целиком в том же потоке пула, где
+вызвано приложение: курсор потокового ответа (export_posts) и сигнал
+request_finished остаются на соединении с базой этого потока. Куски
+передаются в цикл событий через очередь на STREAM_BUFFER сообщений;
+если клиент не успевает, поток ждёт. Тела запросов больше
+SPOOL_MAX_MEMORY байт складываются во временный файл.
+"""
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+SPOOL_MAX_MEMORY = 2 ** 20
+STREAM_BUFFER = 16
+
+
+def environ(scope, body):
+    """WSGI environ по ASGI scope (HTTP)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    # WSGI: путь без %-кодирования, байты UTF-8 как строка latin-1.
+    path = scope['path']
+    root = scope.get('root_path', '')
+    if root and path.startswith(root):
+        path = path[len(root):]
+    result = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('raw_path'):
+        result['RAW_URI'] = scope['raw_path'].decode('latin-1')
+        if result['QUERY_STRING']:
+            result['RAW_URI'] += f'?{result["QUERY_STRING"]}'
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        result[name] = (f'{result[name]},{value}' if name in result
+                        else value)
+    return result
+
+
+class WSGIBridge:
+    """ASGI 3 → WSGI с ограниченным пулом потоков."""
+
+    def __init__(self, application, max_workers=None):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers or settings.ASGI_THREADS, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Тип соединения {scope["type"]} '
+                             f'не поддерживается.')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(STREAM_BUFFER)
+        gone = threading.Event()
+
+        def emit(message):
+            """Из потока пула: отдать сообщение; False — клиент ушёл."""
+            asyncio.run_coroutine_threadsafe(
+                queue.put(message), loop).result()
+            return not gone.is_set()
+
+        def respond():
+            try:
+                self.call(environ(scope, body), emit)
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop)
+
+        worker = loop.run_in_executor(self.executor, respond)
+        finished = False
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    finished = True
+                    break
+                await send(message)
+        finally:
+            if not finished:
+                # Отправка прервалась: поток допишет не больше одного
+                # сообщения, закроет ответ и пришлёт None.
+                gone.set()
+                while await queue.get() is not None:
+                    pass
+        await worker
+
+    async def read_body(self, receive):
+        """Тело запроса целиком, без потока; None — клиент ушёл."""
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def call(self, environ, emit):
+        """
+        Вызвать WSGI-приложение в потоке пула, прочитать и закрыть ответ
+        здесь же; сообщения ASGI отдаются через emit.
+        """
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [int(status.split(' ', 1)[0]), [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]]
+
+        def start():
+            # Генератор вызывает start_response при первой итерации.
+            status, headers = started
+            return emit({'type': 'http.response.start', 'status': status,
+                         'headers': headers})
+
+        try:
+            result = self.application(environ, start_response)
+            try:
+                self.stream(result, start, emit)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            environ['wsgi.input'].close()
+
+    def stream(self, result, start, emit):
+        """Отдать тело ответа; emit вернул False — клиент ушёл, бросить."""
+        pending = b''
+        for chunk in result:
+            if not chunk:
+                continue
+            if pending:
+                # Кусок уходит, как только ясно, что он не последний.
+                if not emit({'type': 'http.response.body', 'body': pending,
+                             'more_body': True}):
+                    return
+            elif not start():
+                return
+            pending = chunk
+        if pending or start():
+            emit({'type': 'http.response.body', 'body': pending})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,163 @@
+import asyncio
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.utils import timezone
+
+from core.asgi import WSGIBridge, environ
+from core.metrics import PERCENTILES, percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнить WSGI и ASGI-мост при множестве медленных клиентов. '
+            'Оба варианта получают одинаковое число потоков; медленный '
+            'клиент принимает ответ --client-delay секунд. В WSGI поток '
+            'ждёт клиента, в ASGI ждёт корутина. Отчёт — JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=64,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Запросов на каждый вариант.')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Потоков у сервера в обоих вариантах.')
+        parser.add_argument('--client-delay', type=float, default=0.2,
+                            help='Секунд на передачу ответа клиенту.')
+        parser.add_argument('--path', default='/',
+                            help='Адрес страницы (можно с ?page=N).')
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def scope(self):
+        path, _, query = self.path.partition('?')
+        return {'type': 'http', 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+
+    # WSGI: поток отвечает клиенту сам и ждёт, пока тот примет ответ.
+
+    def wsgi_request(self, application, submitted):
+        statuses = []
+        request = environ(self.scope(), io.BytesIO())
+        result = application(
+            request, lambda status, headers, exc_info=None:
+            statuses.append(int(status.split(' ', 1)[0])))
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()
+        time.sleep(self.client_delay)
+        return statuses[0], time.perf_counter() - submitted
+
+    def run_wsgi(self, application):
+        slots = threading.BoundedSemaphore(self.clients)
+
+        def client_done(future):
+            slots.release()
+
+        futures = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.threads) as executor:
+            for _ in range(self.requests):
+                slots.acquire()
+                future = executor.submit(self.wsgi_request, application,
+                                         time.perf_counter())
+                future.add_done_callback(client_done)
+                futures.append(future)
+        elapsed = time.perf_counter() - start
+        return self.summary([future.result() for future in futures],
+                            elapsed)
+
+    # ASGI: поток только вызывает Django, ответ уходит из цикла событий.
+
+    async def asgi_request(self, bridge):
+        submitted = time.perf_counter()
+        statuses = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'',
+                    'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif not message.get('more_body', False):
+                await asyncio.sleep(self.client_delay)
+
+        await bridge(self.scope(), receive, send)
+        return statuses[0], time.perf_counter() - submitted
+
+    async def run_asgi(self, application):
+        bridge = WSGIBridge(application, max_workers=self.threads)
+        queue = iter(range(self.requests))
+        results = []
+
+        async def client():
+            for _ in queue:
+                results.append(await self.asgi_request(bridge))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(self.clients)))
+        elapsed = time.perf_counter() - start
+        bridge.executor.shutdown()
+        return self.summary(results, elapsed)
+
+    def summary(self, results, elapsed):
+        latency = sorted(seconds * 1000 for _, seconds in results)
+        statuses = {}
+        for status, _ in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'requests': len(results),
+            'seconds': round(elapsed, 2),
+            'requests_per_sec': round(len(results) / elapsed, 1),
+            'status': statuses,
+            'latency_ms': {f'p{rank}': round(percentile(latency, rank), 1)
+                           for rank in PERCENTILES},
+        }
+
+    def handle(self, *args, **options):
+        for name in ('clients', 'requests', 'threads'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} должно быть больше нуля.')
+        self.clients = options['clients']
+        self.requests = options['requests']
+        self.threads = options['threads']
+        self.client_delay = options['client_delay']
+        self.path = options['path']
+        application = get_wsgi_application()
+        # Прогрев: шаблоны, кэши, соединение с базой.
+        self.wsgi_request(application, time.perf_counter())
+
+        self.stderr.write('wsgi...')
+        wsgi = self.run_wsgi(application)
+        self.stderr.write('asgi...')
+        asgi = asyncio.run(self.run_asgi(application))
+        report = {
+            'created': timezone.now().isoformat(),
+            'path': self.path,
+            'clients': self.clients,
+            'threads': self.threads,
+            'client_delay_s': self.client_delay,
+            'python': sys.version.split()[0],
+            'wsgi': wsgi,
+            'asgi': asgi,
+            'speedup': round(asgi['requests_per_sec']
+                             / wsgi['requests_per_sec'], 2),
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f'Отчёт записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,122 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+# Функции процессов пула. core.tasks импортируется внутри: при запуске
+# через spawn модуль загружается до django.setup().
+
+def init_process():
+    if not apps.ready:
+        django.setup()
+    # Соединения родителя, унаследованные при fork, не используются.
+    connections.close_all()
+
+
+def execute(name, args):
+    from core import tasks
+    try:
+        tasks.execute(name, args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Выполнять фоновые задачи (core.tasks) пулом процессов. '
+            'Несколько обработчиков могут работать одновременно: задачу '
+            'берёт только один. С --once — пока готовые задачи не кончатся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=settings.TASK_WORKERS,
+                            help='Процессов в пуле; 0 — в этом процессе.')
+        parser.add_argument('--poll', type=float,
+                            default=settings.TASK_POLL_INTERVAL,
+                            help='Секунд между проверками пустой очереди.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выйти, когда готовых задач не останется.')
+
+    def finish(self, task, error=None):
+        from core import tasks
+        if error is None:
+            tasks.succeeded(task)
+            self.done += 1
+            return
+        self.failed += 1
+        message = f'{type(error).__name__}: {error}'
+        tasks.failed(task, message)
+        self.stderr.write(f'{task.name}{task.args}: {message}')
+
+    def run_inline(self):
+        from core import tasks
+        while True:
+            tasks.release_stale()
+            claimed = tasks.claim(1)
+            if not claimed:
+                if self.once:
+                    return
+                time.sleep(self.poll)
+                continue
+            task = claimed[0]
+            try:
+                tasks.execute(task.name, task.args)
+            except Exception as error:
+                self.finish(task, error)
+            else:
+                self.finish(task)
+
+    def run_pool(self, processes):
+        from core import tasks
+        running = {}
+        connections.close_all()
+        pool = ProcessPoolExecutor(processes, initializer=init_process)
+        try:
+            while True:
+                tasks.release_stale()
+                for task in tasks.claim(processes - len(running)):
+                    running[pool.submit(execute, task.name, task.args)] = task
+                if not running:
+                    if self.once:
+                        return
+                    time.sleep(self.poll)
+                    continue
+                finished, _ = wait(running, timeout=self.poll,
+                                   return_when=FIRST_COMPLETED)
+                broken = False
+                for future in finished:
+                    error = future.exception()
+                    broken = broken or isinstance(error, BrokenProcessPool)
+                    self.finish(running.pop(future), error)
+                if broken:
+                    # Процесс пула погиб: остальные задачи пула тоже
+                    # завершатся ошибкой, пул создаётся заново.
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(processes,
+                                               initializer=init_process)
+        finally:
+            # cancel_futures у shutdown появился только в Python 3.9.
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=False)
+            tasks.release(running.values())
+
+    def handle(self, *args, **options):
+        if options['processes'] < 0:
+            raise CommandError('--processes не может быть отрицательным.')
+        self.once, self.poll = options['once'], options['poll']
+        self.done = self.failed = 0
+        try:
+            if options['processes']:
+                self.run_pool(options['processes'])
+            else:
+                self.run_inline()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'Задач выполнено: {self.done}, ошибок: {self.failed}'))
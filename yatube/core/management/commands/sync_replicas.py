@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = ('Скопировать основную базу SQLite в файлы реплик '
+            '(DATABASE_REPLICAS) — замена репликации для локальной '
+            'проверки. С --interval копирует по кругу, имитируя отставание.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Повторять каждые N секунд до Ctrl+C.')
+
+    def copy(self, source, target):
+        """Онлайн-копия: читатели реплики видят целую базу до и после."""
+        original, replica = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            original.backup(replica)
+        finally:
+            original.close()
+            replica.close()
+
+    def sync(self, source, targets):
+        start = time.monotonic()
+        for target in targets:
+            self.copy(source, target)
+        return time.monotonic() - start
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        aliases = settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('Реплик нет: задайте YATUBE_REPLICAS.')
+        if any(settings.DATABASES[alias]['ENGINE'] != primary['ENGINE']
+               or primary['ENGINE'] != 'django.db.backends.sqlite3'
+               for alias in aliases):
+            raise CommandError('Команда копирует только файлы SQLite.')
+        targets = [settings.DATABASES[alias]['NAME'] for alias in aliases]
+        while True:
+            elapsed = self.sync(primary['NAME'], targets)
+            self.stdout.write(
+                f'Реплики обновлены ({len(targets)}) за {elapsed:.2f} с')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,100 @@
+"""
+Метрики запросов по представлениям: число SQL-запросов, время в базе,
+время рендеринга шаблонов, размер ответа и общее время.
+
+Последние QUERY_METRICS_BUFFER замеров каждого представления хранятся
+в кольцевом буфере процесса; отчёт считает по ним перцентили.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+METRICS = ('queries', 'sql_ms', 'render_ms', 'bytes', 'total_ms')
+PERCENTILES = (50, 90, 99)
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = {}
+
+
+class Collector:
+    """Замер одного запроса; вызывается как execute_wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql += time.perf_counter() - start
+
+
+def current():
+    return getattr(_local, 'collector', None)
+
+
+def activate(collector):
+    _local.collector = collector
+
+
+def deactivate():
+    _local.collector = None
+
+
+def add_render_time(seconds):
+    collector = current()
+    if collector is not None:
+        collector.render += seconds
+
+
+def record(view_name, collector, total, size):
+    sample = {
+        'queries': collector.queries,
+        'sql_ms': collector.sql * 1000,
+        'render_ms': collector.render * 1000,
+        'bytes': size,
+        'total_ms': total * 1000,
+    }
+    with _lock:
+        buffer = _samples.get(view_name)
+        if buffer is None:
+            buffer = _samples[view_name] = deque(
+                maxlen=settings.QUERY_METRICS_BUFFER)
+        buffer.append(sample)
+
+
+def percentile(values, rank):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    index = max(0, -(-rank * len(values) // 100) - 1)
+    return values[index]
+
+
+def report():
+    with _lock:
+        snapshot = {view: list(buffer) for view, buffer in _samples.items()}
+    views = {}
+    for view, samples in sorted(snapshot.items()):
+        summary = {'samples': len(samples)}
+        for metric in METRICS:
+            values = sorted(sample[metric] for sample in samples
+                            if sample[metric] is not None)
+            if values:
+                summary[metric] = {f'p{rank}': round(percentile(values, rank),
+                                                     2)
+                                   for rank in PERCENTILES}
+                summary[metric]['max'] = round(values[-1], 2)
+        views[view] = summary
+    return {'pid': os.getpid(), 'views': views}
+
+
+def reset():
+    with _lock:
+        _samples.clear()
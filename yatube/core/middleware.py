@@ -0,0 +1,56 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, replicas
+
+
+class QueryMetricsMiddleware:
+    """Собирает метрики SQL и рендеринга для каждого представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = metrics.Collector()
+        start = time.perf_counter()
+        metrics.activate(collector)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            metrics.deactivate()
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            size = (None if response.streaming
+                    else len(response.content))
+            metrics.record(match.view_name, collector,
+                           time.perf_counter() - start, size)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    После записи читать из основной базы REPLICA_STICKY_SECONDS секунд
+    (read-your-writes): признак хранится в cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replicas.STICKY_COOKIE in request.COOKIES:
+            request.read_primary = True
+        response = self.get_response(request)
+        wrote = (request.method not in replicas.SAFE_METHODS
+                 or getattr(request, 'pin_primary', False))
+        if wrote and replicas.replicas():
+            response.set_cookie(replicas.STICKY_COOKIE, '1',
+                                max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,58 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Фоновая задача очереди core.tasks."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ждёт'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField(max_length=100,
+                            verbose_name='Задача')
+    args = models.TextField(default='[]',
+                            verbose_name='Аргументы (JSON)')
+    key = models.CharField(max_length=200,
+                           null=True,
+                           blank=True,
+                           verbose_name='Ключ дедупликации')
+    status = models.CharField(max_length=10,
+                              choices=STATUSES,
+                              default=PENDING,
+                              verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток не больше')
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name='Выполнить после')
+    locked_at = models.DateTimeField(null=True,
+                                     blank=True,
+                                     verbose_name='Взята в работу')
+    last_error = models.TextField(blank=True,
+                                  verbose_name='Последняя ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+
+    class Meta:
+        constraints = [
+            # Пока задача ждёт, такая же с тем же ключом не ставится.
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=Q(status='pending'),
+                name='unique pending task'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{self.args} ({self.status})'
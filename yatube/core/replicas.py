@@ -0,0 +1,108 @@
+"""
+Чтение лент с реплик базы, запись — только в основную базу.
+
+Представления, помеченные replica_reads, читают с одной из реплик
+DATABASE_REPLICAS (одна реплика на весь запрос); остальной код и все
+записи идут в default. После записи (любой не-GET запрос или pin())
+ReplicaStickinessMiddleware ставит cookie на REPLICA_STICKY_SECONDS:
+пока она жива, чтения пользователя идут в основную базу и он видит
+свои изменения, даже если реплика отстаёт.
+
+Кэши не должны запоминать отставшие данные: если версия области
+страницы моложе REPLICA_MAX_LAG, остаток запроса читает из основной
+базы (recent/use_primary), а сводки авторов и реестр групп всегда
+строятся по основной базе.
+
+Для проверки на одной машине реплики — копии файла SQLite, которые
+обновляет команда sync_replicas (замена настоящей репликации).
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Сессии с реплики читать нельзя: новой сессии там ещё нет, и
+# SessionMiddleware сочтёт её пустой и разлогинит пользователя.
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def current():
+    """Псевдоним базы для чтений в текущем потоке или None (default)."""
+    return getattr(_state, 'alias', None)
+
+
+def use_primary():
+    """Остаток текущего запроса читать из основной базы."""
+    _state.alias = None
+
+
+def recent(stamps):
+    """Есть ли среди версий изменения, которых реплика может не знать."""
+    if current() is None:
+        return False
+    horizon = time.time() - settings.REPLICA_MAX_LAG
+    return max(stamps, default=horizon) > horizon
+
+
+def pin(request):
+    """Читать из основной базы: в этом запросе и в окне после него."""
+    request.read_primary = True
+    request.pin_primary = True
+
+
+def _load_user(request):
+    """Прочитать ленивый request.user (и сессию) из основной базы."""
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated
+
+
+def replica_reads(view):
+    """Чтения представления — с реплики, если пользователь не «прилип»."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        aliases = replicas()
+        if (not aliases or request.method not in SAFE_METHODS
+                or getattr(request, 'read_primary', False)):
+            request.db_alias = DEFAULT_DB_ALIAS
+            return view(request, *args, **kwargs)
+        _load_user(request)
+        request.db_alias = _state.alias = random.choice(aliases)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.alias = None
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтения в replica_reads — с выбранной реплики, записи — в default."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return current()
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный с реплики, сохраняется в основную базу.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема приходит на реплики вместе с данными.
+        return db not in replicas()
@@ -0,0 +1,51 @@
+"""
+Настройка соединений SQLite: WAL и прагмы из SQLITE_PRAGMAS.
+
+Обработчик connection_created выполняет прагмы при каждом новом
+соединении с базой SQLite (другие базы не трогает). С WAL читатели не
+ждут писателя, synchronous=NORMAL в режиме WAL не теряет целостность
+при сбое процесса, mmap_size и cache_size уменьшают число системных
+вызовов чтения, busy_timeout заставляет писателя подождать блокировку,
+а не сразу падать с «database is locked». Соединения переживают запрос
+благодаря CONN_MAX_AGE, поэтому прагмы выполняются редко.
+
+    SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Значения по умолчанию; SQLITE_PRAGMAS в настройках их дополняет.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+}
+
+
+def pragmas():
+    """Прагмы с учётом настроек; значение None отключает прагму."""
+    configured = {**PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in configured.items()
+            if value is not None}
+
+
+def apply(connection, values=None):
+    """Выполнить прагмы на соединении; вернуть их итоговые значения."""
+    applied = {}
+    with connection.cursor() as cursor:
+        for name, value in (pragmas() if values is None else values).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            applied[name] = row[0] if row else None
+    return applied
+
+
+@receiver(connection_created)
+def configure(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply(connection)
@@ -0,0 +1,293 @@
+"""
+Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+Каждая запись — одна транзакция (атомарно для читателей других
+процессов). Размер ограничен OPTIONS MAX_ENTRIES и MAX_BYTES: сначала
+удаляются просроченные записи, затем давно не читавшиеся (LRU).
+Время чтения обновляется не чаще ACCESS_RESOLUTION секунд, чтобы
+чтения почти не превращались в записи. Число и размер записей ведут
+триггеры в строке cache_totals, так что проверка переполнения при
+записи не пересчитывает всю таблицу.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_BYTES': 64 * 2 ** 20},
+    }}
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_totals ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL,'
+    ' bytes INTEGER NOT NULL)',
+    'CREATE TRIGGER IF NOT EXISTS cache_inserted AFTER INSERT ON cache '
+    'BEGIN UPDATE cache_totals SET entries = entries + 1,'
+    ' bytes = bytes + NEW.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_deleted AFTER DELETE ON cache '
+    'BEGIN UPDATE cache_totals SET entries = entries - 1,'
+    ' bytes = bytes - OLD.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_resized AFTER UPDATE OF size ON cache '
+    'BEGIN UPDATE cache_totals SET bytes = bytes - OLD.size + NEW.size; END',
+)
+# Итоги для файла, созданного до cache_totals (или нового).
+SEED_TOTALS = ('INSERT OR IGNORE INTO cache_totals (id, entries, bytes) '
+               'SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM cache')
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.max_bytes = int(options.get('MAX_BYTES', 0)) or None
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 60))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    # Соединения: одно на поток, автокоммит, транзакции — явно.
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=self.busy_timeout,
+                isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # Иначе INSERT OR REPLACE удаляет старую запись без триггера.
+            connection.execute('PRAGMA recursive_triggers=ON')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            if connection.execute(
+                    'SELECT 1 FROM cache_totals').fetchone() is None:
+                connection.execute(SEED_TOTALS)
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _count(self, name, delta=1):
+        with self._stats_lock:
+            self._stats[name] += delta
+
+    def _prepare(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    # Чтение.
+
+    def _fetch(self, keys):
+        """{ключ: значение} для живых записей, с обновлением времени
+        чтения."""
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value, accessed FROM cache WHERE key IN '
+            f'({placeholders}) AND (expires IS NULL OR expires > ?)',
+            (*keys, now)).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > self.access_resolution]
+        if stale:
+            self._connection.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN '
+                f'({",".join("?" * len(stale))})', (now, *stale))
+        found = {key: pickle.loads(value) for key, value, _ in rows}
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._prepare(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        prepared = {self._prepare(key, version): key for key in keys}
+        found = self._fetch(list(prepared))
+        return {prepared[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._prepare(key, version)
+        row = self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND '
+            '(expires IS NULL OR expires > ?)', (key, time.time())).fetchone()
+        return row is not None
+
+    # Запись.
+
+    def _store(self, connection, key, value, timeout, mode='set'):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if mode == 'add':
+            row = connection.execute(
+                'SELECT 1 FROM cache WHERE key = ? AND '
+                '(expires IS NULL OR expires > ?)', (key, now)).fetchone()
+            if row is not None:
+                return False
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed,'
+            ' size) VALUES (?, ?, ?, ?, ?)',
+            (key, sqlite3.Binary(data), expires, now, len(data)))
+        self._count('sets')
+        return True
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare(key, version)
+        with self._write() as connection:
+            self._store(connection, key, value, timeout)
+            self._cull(connection)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare(key, version)
+        with self._write() as connection:
+            added = self._store(connection, key, value, timeout, mode='add')
+            if added:
+                self._cull(connection)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as connection:
+            for key, value in data.items():
+                self._store(connection, self._prepare(key, version), value,
+                            timeout)
+            self._cull(connection)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare(key, version)
+        with self._write() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? AND '
+                '(expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()))
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._prepare(key, version)
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ? AND '
+                '(expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (sqlite3.Binary(data), len(data), key))
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._prepare(key, version) for key in keys]
+        if not keys:
+            return
+        with self._write() as connection:
+            placeholders = ','.join('?' * len(keys))
+            connection.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys)
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами потока.
+        pass
+
+    # Вытеснение.
+
+    def _cull(self, connection):
+        entries, total = connection.execute(
+            'SELECT entries, bytes FROM cache_totals').fetchone()
+        over_entries = entries > self._max_entries
+        over_bytes = self.max_bytes is not None and total > self.max_bytes
+        if not (over_entries or over_bytes):
+            return
+        removed = connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),)).rowcount
+        entries -= removed
+        if entries > self._max_entries:
+            # Как в бэкендах Django: удаляем 1/CULL_FREQUENCY записей.
+            keep = 0
+            if self._cull_frequency:
+                keep = entries - entries // self._cull_frequency
+            removed += connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', (entries - keep,)).rowcount
+        if self.max_bytes is not None:
+            total = connection.execute(
+                'SELECT bytes FROM cache_totals').fetchone()[0]
+            target = total - self.max_bytes
+            if target > 0:
+                rows = connection.execute(
+                    'SELECT key, size FROM cache ORDER BY accessed')
+                victims = []
+                for key, size in rows:
+                    victims.append(key)
+                    target -= size
+                    if target <= 0:
+                        break
+                connection.executemany('DELETE FROM cache WHERE key = ?',
+                                       ((key,) for key in victims))
+                removed += len(victims)
+        self._count('evictions', removed)
+
+    # Статистика.
+
+    def stats(self):
+        """Счётчики текущего процесса и общее состояние файла кэша."""
+        entries, total, expired = self._connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0),'
+            ' COALESCE(SUM(expires IS NOT NULL AND expires <= ?), 0)'
+            ' FROM cache', (time.time(),)).fetchone()
+        with self._stats_lock:
+            process = dict(self._stats)
+        lookups = process['hits'] + process['misses']
+        return {
+            'location': self.location,
+            'entries': entries,
+            'bytes': total,
+            'expired': expired,
+            'max_entries': self._max_entries,
+            'max_bytes': self.max_bytes,
+            'process': dict(
+                process, pid=os.getpid(),
+                hit_rate=process['hits'] / lookups if lookups else None),
+        }
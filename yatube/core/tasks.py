@@ -0,0 +1,109 @@
+"""
+Фоновые задачи в базе данных (core.Task).
+
+Побочные эффекты записи — миниатюры, письма — представления не выполняют
+сами, а ставят в очередь функцией enqueue. Строка задачи пишется в
+текущей транзакции, поэтому обработчик видит её только после фиксации
+и никогда не берёт задачу для отменённой записи. Разбирает очередь
+команда run_tasks пулом процессов.
+
+Задача — функция, зарегистрированная декоратором task; модули tasks.py
+приложений импортируются при запуске (CoreConfig.ready). Аргументы
+хранятся в JSON. Упавшая задача повторяется через
+TASK_RETRY_DELAY * 2 ** (попытка - 1) секунд, всего не больше
+max_attempts раз, потом остаётся в состоянии failed. Пока задача с
+ключом key ждёт выполнения, такая же не ставится повторно.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+def task(name, max_attempts=None):
+    """Зарегистрировать функцию как задачу name."""
+    def decorator(function):
+        REGISTRY[name] = (function, max_attempts)
+        return function
+    return decorator
+
+
+def enqueue(name, *args, key=None, delay=0):
+    """Поставить задачу name(*args); повтор по ключу key не ставится."""
+    if name not in REGISTRY:
+        raise ValueError(f'Задача {name} не зарегистрирована.')
+    max_attempts = REGISTRY[name][1] or settings.TASK_MAX_ATTEMPTS
+    Task.objects.bulk_create([Task(
+        name=name, args=json.dumps(args), key=key,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=True)
+
+
+def execute(name, args):
+    REGISTRY[name][0](*json.loads(args))
+
+
+def claim(limit):
+    """Взять в работу до limit готовых задач; другим обработчикам — нет."""
+    now = timezone.now()
+    ids = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=now,
+    ).order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+    claimed = [
+        task_id for task_id in list(ids)
+        if Task.objects.filter(id=task_id, status=Task.PENDING).update(
+            status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+    ]
+    return list(Task.objects.filter(id__in=claimed).order_by('run_at', 'id'))
+
+
+def succeeded(task):
+    Task.objects.filter(id=task.id).delete()
+
+
+def failed(task, error):
+    """Повторить задачу позже или оставить её в состоянии failed."""
+    if task.attempts >= task.max_attempts:
+        logger.error('Задача %s (%s) не выполнена: %s',
+                     task.name, task.args, error)
+        Task.objects.filter(id=task.id).update(
+            status=Task.FAILED, locked_at=None, last_error=error)
+        return
+    delay = settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+    _requeue(task, last_error=error,
+             run_at=timezone.now() + timedelta(seconds=delay))
+
+
+def _requeue(task, **fields):
+    try:
+        with transaction.atomic():
+            Task.objects.filter(id=task.id, status=Task.RUNNING).update(
+                status=Task.PENDING, locked_at=None, **fields)
+    except IntegrityError:
+        # Такая же задача уже ждёт и сделает ту же работу.
+        Task.objects.filter(id=task.id).delete()
+
+
+def release_stale():
+    """Задачи упавших обработчиков: считать попытку неудачной."""
+    horizon = timezone.now() - timedelta(seconds=settings.TASK_TIMEOUT)
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=horizon)
+    for task in stale:
+        failed(task, f'Не завершилась за {settings.TASK_TIMEOUT} с')
+
+
+def release(tasks):
+    """Вернуть взятые задачи в очередь, не считая попытку."""
+    for task in tasks:
+        _requeue(task, attempts=F('attempts') - 1)
@@ -0,0 +1,478 @@
+import tempfile
+import shutil
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from django.core.wsgi import get_wsgi_application
+from posts.models import Post
+
+from . import metrics, replicas, sqlite, tasks
+from .asgi import WSGIBridge
+from .management.commands.sync_replicas import Command as SyncReplicas
+from .models import Task
+from .sqlite_cache import SQLiteCache
+
+User = get_user_model()
+
+
+class SQLiteCacheTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_shared_between_instances(self):
+        '''Записи видны другому экземпляру (процессу) с тем же файлом.'''
+        self.make_cache().set_many({'a': 1, 'b': [2]})
+        other = self.make_cache()
+        self.assertEqual(other.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2]})
+        self.assertFalse(other.add('a', 10))
+        self.assertEqual(other.incr('a', 5), 6)
+        other.delete('b')
+        self.assertIsNone(self.make_cache().get('b'))
+
+    def test_expired_entries_are_missing(self):
+        '''Просроченная запись не возвращается.'''
+        cache = self.make_cache()
+        cache.set('a', 1, timeout=-1)
+        self.assertIsNone(cache.get('a'))
+        self.assertFalse(cache.has_key('a'))
+
+    def test_lru_eviction(self):
+        '''При переполнении вытесняются давно не читавшиеся записи.'''
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3,
+                                ACCESS_RESOLUTION=0)
+        for key in 'abc':
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_many(['a', 'c', 'd']),
+                         {'a': 'a', 'c': 'c', 'd': 'd'})
+
+    def test_size_bounded_eviction(self):
+        '''Суммарный размер записей не превышает MAX_BYTES.'''
+        cache = self.make_cache(MAX_BYTES=3000)
+        for i in range(10):
+            cache.set(f'key{i}', 'x' * 1000)
+        self.assertLessEqual(cache.stats()['bytes'], 3000)
+        self.assertEqual(cache.get('key9'), 'x' * 1000)
+
+    def test_totals_follow_writes(self):
+        '''Итоги в cache_totals совпадают с таблицей после любых записей.'''
+        with sqlite3.connect(self.location) as database:
+            database.execute('CREATE TABLE cache (key TEXT PRIMARY KEY,'
+                             ' value BLOB NOT NULL, expires REAL,'
+                             ' accessed REAL NOT NULL, size INTEGER NOT NULL)')
+            database.execute("INSERT INTO cache VALUES ('old', x'00', NULL,"
+                             " 0, 5)")
+        cache = self.make_cache(MAX_ENTRIES=3)
+        cache.set_many({'a': 1, 'b': 'x' * 100})
+        cache.set('a', 'x' * 50)
+        cache.add('c', 1)
+        cache.incr('c', 10 ** 30)
+        cache.delete('b')
+        cache.set('d', 4)
+        database = cache._connection
+        self.assertEqual(
+            database.execute('SELECT entries, bytes FROM cache_totals')
+            .fetchone(),
+            database.execute('SELECT COUNT(*), SUM(size) FROM cache')
+            .fetchone())
+
+
+class CacheStatsViewTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_stats_for_staff_only(self):
+        '''Статистика кэша доступна только персоналу.'''
+        url = reverse('core:cache_stats')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True))
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'core.sqlite_cache.SQLiteCache',
+            'LOCATION': os.path.join(self.directory, 'cache.sqlite3'),
+        }}):
+            response = self.client.get(url)
+        self.assertEqual(response.json()['backend'], 'SQLiteCache')
+        self.assertIn('entries', response.json())
+
+
+class QueryMetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True))
+
+    def test_views_are_measured(self):
+        '''Запросы, время и размер ответа попадают в отчёт.'''
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('core:metrics'))
+        summary = response.json()['views']['posts:index']
+        self.assertEqual(summary['samples'], 1)
+        self.assertGreater(summary['queries']['p50'], 0)
+        self.assertGreater(summary['render_ms']['p50'], 0)
+        self.assertGreater(summary['bytes']['max'], 0)
+
+    def test_report_page(self):
+        '''Страница отчёта выводит представления.'''
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('core:metrics_report'))
+        self.assertContains(response, 'posts:index')
+
+
+class SQLitePragmasTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open(self):
+        path = os.path.join(self.directory, 'db.sqlite3')
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': path},
+                                  alias='pragmas')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connection_configured(self):
+        """Новое соединение получает WAL и прагмы из настроек."""
+        wrapper = self.open()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 20000)
+        self.assertEqual(self.pragma(wrapper, 'mmap_size'),
+                         sqlite.PRAGMAS['mmap_size'])
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': None,
+                                       'cache_size': -1000})
+    def test_settings_override(self):
+        """SQLITE_PRAGMAS меняет значения, None отключает прагму."""
+        wrapper = self.open()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -1000)
+
+
+@replicas.replica_reads
+def routed_view(request):
+    router = replicas.ReplicaRouter()
+    return (router.db_for_read(User), router.db_for_write(User),
+            replicas.recent([time.time()]))
+
+
+@replicas.replica_reads
+def session_view(request):
+    return replicas.ReplicaRouter().db_for_read(Session)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+
+    def test_reads_routed_in_marked_views(self):
+        """Чтения помеченного представления — с реплики, записи — в default."""
+        request = RequestFactory().get('/')
+        self.assertEqual(routed_view(request), ('replica', 'default', True))
+        self.assertEqual(request.db_alias, 'replica')
+        self.assertIsNone(replicas.current())
+        request = RequestFactory().post('/')
+        self.assertEqual(routed_view(request), (None, 'default', False))
+
+    def test_sessions_read_from_primary(self):
+        """Сессии всегда читаются из основной базы."""
+        self.assertEqual(session_view(RequestFactory().get('/')), 'default')
+
+    def test_sticky_after_write(self):
+        """После записи пользователь читает из основной базы."""
+        user = User.objects.create_user(username='auth')
+        self.client.force_login(user)
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Новый пост'})
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.wsgi_request.db_alias, 'default')
+        self.assertContains(response, 'Новый пост')
+
+
+class SyncReplicasTests(TestCase):
+
+    def test_copy(self):
+        """Команда копирует основную базу в файл реплики."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = os.path.join(directory, 'primary.sqlite3')
+        replica = os.path.join(directory, 'replica.sqlite3')
+        with sqlite3.connect(primary) as database:
+            database.execute('CREATE TABLE t (x)')
+            database.execute('INSERT INTO t VALUES (1)')
+        SyncReplicas().sync(primary, [replica])
+        with sqlite3.connect(replica) as database:
+            self.assertEqual(
+                database.execute('SELECT x FROM t').fetchall(), [(1,)])
+
+
+def echo_application(environ, start_response):
+    start_response('201 Created', [('Content-Type', 'text/plain'),
+                                   ('X-Path', environ['PATH_INFO'])])
+    yield environ['QUERY_STRING'].encode()
+    yield environ['HTTP_X_TOKEN'].encode()
+    yield environ['wsgi.input'].read()
+
+
+class BridgeClientMixin:
+
+    def call(self, application, method='GET', path='/', query=b'',
+             headers=(), body=b'', send=None, max_workers=2):
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'raw_path': quote(path).encode(),
+                 'query_string': query, 'headers': list(headers)}
+        chunks = [body[:3], body[3:]]
+        sent = []
+
+        async def receive():
+            chunk = chunks.pop(0)
+            return {'type': 'http.request', 'body': chunk,
+                    'more_body': bool(chunks)}
+
+        async def record(message):
+            sent.append(message)
+            if send is not None:
+                await send(message)
+
+        bridge = WSGIBridge(application, max_workers=max_workers)
+        try:
+            asyncio.run(bridge(scope, receive, record))
+        finally:
+            bridge.executor.shutdown()
+        start, *bodies = sent
+        return start, b''.join(message['body'] for message in bodies)
+
+
+class ASGIBridgeTests(BridgeClientMixin, TestCase):
+
+    def test_streaming_wsgi_application(self):
+        '''Заголовки, параметры и тело по кускам доходят до приложения.'''
+        start, body = self.call(
+            echo_application, 'POST', '/путь/', b'a=1',
+            [(b'x-token', b't'), (b'content-length', b'6')], b'abcdef')
+        self.assertEqual(start['status'], 201)
+        self.assertIn((b'x-path', '/путь/'.encode()), start['headers'])
+        self.assertEqual(body, b'a=1tabcdef')
+
+    def test_django_page(self):
+        '''Страница Django через ASGI-мост.'''
+        # Статичная страница: поток пула пишет в базу мимо транзакции теста.
+        start, body = self.call(get_wsgi_application(), path='/about/author/',
+                                headers=[(b'host', b'testserver')])
+        self.assertEqual(start['status'], 200)
+        self.assertIn('Привет, я автор'.encode(), body)
+
+    def test_stream_read_and_closed_in_one_thread(self):
+        '''Потоковый ответ читается и закрывается в одном потоке пула.'''
+        threads = []
+
+        class Stream:
+            def __iter__(self):
+                for chunk in (b'a', b'b', b'c'):
+                    threads.append(threading.get_ident())
+                    yield chunk
+
+            def close(self):
+                threads.append(threading.get_ident())
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return Stream()
+
+        async def slow_client(message):
+            await asyncio.sleep(0.01)
+
+        start, body = self.call(application, send=slow_client, max_workers=4)
+        self.assertEqual(body, b'abc')
+        self.assertEqual(len(threads), 4)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_client_gone_closes_stream(self):
+        '''Если клиент ушёл, ответ закрывается, поток не зависает.'''
+        closed = []
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+
+            def chunks():
+                try:
+                    while True:
+                        yield b'x'
+                finally:
+                    closed.append(True)
+            return chunks()
+
+        async def gone(message):
+            if message['type'] == 'http.response.body':
+                raise OSError('Клиент закрыл соединение')
+
+        with self.assertRaises(OSError):
+            self.call(application, send=gone, max_workers=1)
+        self.assertEqual(closed, [True])
+
+
+class ASGIViewsTests(BridgeClientMixin, TransactionTestCase):
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_export_streamed(self):
+        '''Выгрузка export_posts идёт потоком через ASGI-мост.'''
+        user = User.objects.create_user(username='auth')
+        for text in ('Первый', 'Второй'):
+            Post.objects.create(author=user, text=text)
+        self.client.force_login(user)
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        start, body = self.call(
+            get_wsgi_application(), path=reverse('posts:export'),
+            query=b'author=auth', headers=[
+                (b'host', b'testserver'),
+                (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session}'
+                            .encode())])
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(
+            sorted(json.loads(line)['text'] for line in body.splitlines()),
+            ['Второй', 'Первый'])
+
+    def test_non_ascii_path(self):
+        '''Путь с кириллицей доходит до Django без %-кодирования.'''
+        user = User.objects.create_user(username='иван')
+        Post.objects.create(author=user, text='Пост Ивана')
+        start, body = self.call(
+            get_wsgi_application(), path='/profile/иван/',
+            headers=[(b'host', b'testserver')])
+        self.assertEqual(start['status'], 200)
+        self.assertIn('Пост Ивана'.encode(), body)
+
+
+CALLS = []
+
+
+@tasks.task('core.tests.flaky')
+def flaky(value):
+    CALLS.append(value)
+    if len(CALLS) == 1:
+        raise RuntimeError('сбой')
+
+
+@tasks.task('core.tests.broken', max_attempts=2)
+def broken():
+    raise RuntimeError('всегда сбой')
+
+
+@tasks.task('core.tests.touch')
+def touch(path, value):
+    with open(path, 'a') as file:
+        file.write(value)
+
+
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def run_tasks(self):
+        call_command('run_tasks', once=True, processes=0,
+                     stdout=StringIO(), stderr=StringIO())
+
+    def test_deduplicate(self):
+        '''Ждущая задача с тем же ключом не ставится повторно.'''
+        tasks.enqueue('core.tests.flaky', 1, key='k')
+        tasks.enqueue('core.tests.flaky', 2, key='k')
+        self.assertEqual(Task.objects.count(), 1)
+        tasks.claim(1)
+        tasks.enqueue('core.tests.flaky', 3, key='k')
+        self.assertEqual(Task.objects.count(), 2)
+        with self.assertRaises(ValueError):
+            tasks.enqueue('core.tests.unknown')
+
+    def test_retry_with_backoff(self):
+        '''Упавшая задача откладывается и выполняется повторно.'''
+        tasks.enqueue('core.tests.flaky', 7)
+        self.run_tasks()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertIn('сбой', task.last_error)
+        self.assertGreater(task.run_at, timezone.now() + timedelta(
+            seconds=settings.TASK_RETRY_DELAY - 1))
+        Task.objects.update(run_at=timezone.now())
+        self.run_tasks()
+        self.assertEqual(CALLS, [7, 7])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASK_RETRY_DELAY=0)
+    def test_failed_after_max_attempts(self):
+        '''После max_attempts попыток задача остаётся в failed.'''
+        tasks.enqueue('core.tests.broken')
+        self.run_tasks()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+    def test_process_pool(self):
+        '''С --processes задачи выполняются в процессах пула.'''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'done')
+        for value in 'ab':
+            tasks.enqueue('core.tests.touch', path, value)
+        out = StringIO()
+        call_command('run_tasks', once=True, processes=1, poll=0.1,
+                     stdout=out, stderr=StringIO())
+        with open(path) as file:
+            self.assertEqual(file.read(), 'ab')
+        self.assertFalse(Task.objects.exists())
+        self.assertIn('выполнено: 2, ошибок: 0', out.getvalue())
+
+    def test_release_stale(self):
+        '''Задача упавшего обработчика возвращается в очередь.'''
+        tasks.enqueue('core.tests.flaky', 1)
+        tasks.claim(1)
+        Task.objects.update(locked_at=timezone.now() - timedelta(
+            seconds=settings.TASK_TIMEOUT + 1))
+        tasks.release_stale()
+        self.assertEqual(Task.objects.get().status, Task.PENDING)
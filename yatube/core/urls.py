@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.query_metrics_report, name='metrics_report'),
+    path('metrics.json', views.query_metrics, name='metrics'),
+]
@@ -1,6 +1,11 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.http import JsonResponse
 from django.shortcuts import render
 from http import HTTPStatus
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request,
@@ -19,3 +24,30 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def cache_stats(request):
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    stats = cache.stats() if hasattr(cache, 'stats') else {}
+    return JsonResponse(dict(stats, backend=type(cache).__name__))
+
+
+@staff_member_required
+def query_metrics(request):
+    return JsonResponse(metrics.report())
+
+
+@staff_member_required
+def query_metrics_report(request):
+    report = metrics.report()
+    rows = [
+        (view, summary['samples'],
+         [summary.get(metric, {}) for metric in metrics.METRICS])
+        for view, summary in report['views'].items()
+    ]
+    return render(request, 'core/metrics.html', {
+        'pid': report['pid'],
+        'metric_names': metrics.METRICS,
+        'rows': rows,
+    })
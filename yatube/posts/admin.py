@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.conf import settings
 
+from . import groups, search
 from .models import Post, Group, Comment, Follow
 
 
@@ -11,11 +12,23 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = settings.EMPTY_VALUE
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug', 'description',)
     search_fields = ('title',)
     empty_value_display = settings.EMPTY_VALUE
+    actions = ('flush_registry',)
+
+    def flush_registry(self, request, queryset):
+        groups.flush()
+        self.message_user(request, 'Кэш групп сброшен.')
+    flush_registry.short_description = 'Сбросить кэш групп'
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -0,0 +1,109 @@
+"""
+Сводки авторов для карточек, комментариев и профиля.
+
+Сводка — имя пользователя, имя и фамилия, число постов, подписчиков
+и подписок — хранится в кэше по id (author:<id>), а id ищется по имени
+через author:name:<username>. Пачка сводок читается одним get_many,
+промахи собираются двумя запросами на всю пачку (пользователи
+и счётчики). Сводку удаляют сигналы: создание, правка и удаление
+пользователя, его посты и подписки (на него и его собственные).
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from . import counters
+from .models import User
+
+FIELDS = ('id', 'username', 'first_name', 'last_name')
+TIMEOUT = 60 * 60 * 24
+
+
+def _key(user_id):
+    return f'author:{user_id}'
+
+
+def _name_key(username):
+    return f'author:name:{username}'
+
+
+def _build(user_ids):
+    # Сводка живёт в кэше долго: только по основной базе, не по реплике.
+    users = User.objects.using(DEFAULT_DB_ALIAS).filter(
+        id__in=user_ids).values(*FIELDS)
+    summaries = {user['id']: user for user in users}
+    names = {user_id: {'posts_count': counters.author_posts(user_id),
+                       'followers_count': counters.followers(user_id),
+                       'following_count': counters.following(user_id)}
+             for user_id in summaries}
+    values = counters.get_many(
+        (name for fields in names.values() for name in fields.values()),
+        using=DEFAULT_DB_ALIAS)
+    for user_id, summary in summaries.items():
+        summary['full_name'] = (
+            f"{summary['first_name']} {summary['last_name']}".strip())
+        summary.update((field, values[name])
+                       for field, name in names[user_id].items())
+    return summaries
+
+
+def get_many(user_ids):
+    """Сводки по id: {id: сводка}; несуществующих id в ответе нет."""
+    keys = {_key(user_id): user_id for user_id in set(user_ids)}
+    found = {keys[key]: summary
+             for key, summary in cache.get_many(list(keys)).items()}
+    missing = set(keys.values()) - set(found)
+    if missing:
+        built = _build(missing)
+        cache.set_many({_key(user_id): summary
+                        for user_id, summary in built.items()}, TIMEOUT)
+        cache.set_many({_name_key(summary['username']): user_id
+                        for user_id, summary in built.items()}, TIMEOUT)
+        found.update(built)
+    return found
+
+
+def get(user_id):
+    return get_many([user_id]).get(user_id)
+
+
+def get_by_username(username):
+    """Сводка по имени пользователя или None."""
+    user_id = cache.get(_name_key(username))
+    summary = get(user_id) if user_id is not None else None
+    if summary is None or summary['username'] != username:
+        # Имя не в кэше или пользователя переименовали.
+        user_id = User.objects.filter(username=username).values_list(
+            'id', flat=True).first()
+        summary = get(user_id) if user_id is not None else None
+    return summary
+
+
+def user(summary):
+    """Пользователь только с полями сводки — для вывода в шаблонах."""
+    author = User(**{field: summary[field] for field in FIELDS})
+    author._state.adding = False
+    author._state.db = 'default'
+    return author
+
+
+def attach(objects, field='author', summaries=None):
+    """
+    Подставить objects[i].author из сводок одним чтением кэша
+    (или из уже прочитанных summaries).
+    """
+    objects = list(objects)
+    if summaries is None:
+        summaries = get_many(getattr(obj, f'{field}_id') for obj in objects)
+    if not objects:
+        return objects
+    descriptor = type(objects[0])._meta.get_field(field)
+    for obj in objects:
+        summary = summaries.get(getattr(obj, f'{field}_id'))
+        if summary is not None:
+            descriptor.set_cached_value(obj, user(summary))
+    return objects
+
+
+def invalidate(*user_ids, usernames=()):
+    cache.delete_many([_key(user_id) for user_id in user_ids]
+                      + [_name_key(username) for username in usernames])
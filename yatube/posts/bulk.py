@@ -0,0 +1,62 @@
+"""
+Массовая вставка строк пачками через bulk_create.
+
+bulk_create не вызывает сигналы: после вставки постов и подписок нужно
+пересчитать счётчики (counters.recount) и ленты (feed.backfill).
+"""
+from itertools import islice
+
+from django.db import connections, router
+from django.utils import timezone
+
+
+def create_as_is(model, objects):
+    """
+    Как bulk_create, но значения полей вставляются как есть: pre_save не
+    вызывается, и даты auto_now_add (pub_date, created) берутся из
+    объектов. Поля модели не меняются, сохранения в других потоках
+    получают дату как обычно. Пустая дата заменяется текущим временем.
+    """
+    objects = list(objects)
+    meta = model._meta
+    now = timezone.now()
+    for field in meta.concrete_fields:
+        if getattr(field, 'auto_now_add', False):
+            for obj in objects:
+                if getattr(obj, field.attname) is None:
+                    setattr(obj, field.attname, now)
+    queryset = model._base_manager.using(router.db_for_write(model))
+    ops = connections[queryset.db].ops
+    for with_pk in (True, False):
+        batch = [obj for obj in objects if (obj.pk is not None) == with_pk]
+        if not batch:
+            continue
+        fields = [field for field in meta.concrete_fields
+                  if with_pk or field is not meta.auto_field]
+        size = max(ops.bulk_batch_size(fields, batch), 1)
+        for start in range(0, len(batch), size):
+            queryset._insert(batch[start:start + size], fields=fields,
+                             raw=True)
+
+
+def insert(model, objects, batch_size=1000, ignore_conflicts=False,
+           as_is=False):
+    """
+    Вставить объекты из итератора пачками по batch_size.
+
+    Итератор читается по пачке, так что в памяти не держится весь набор.
+    С as_is — через create_as_is (даты не подменяются). Возвращает число
+    переданных объектов.
+    """
+    objects = iter(objects)
+    total = 0
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return total
+        if as_is:
+            create_as_is(model, batch)
+        else:
+            model.objects.bulk_create(batch,
+                                      ignore_conflicts=ignore_conflicts)
+        total += len(batch)
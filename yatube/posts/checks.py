@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+from django.utils.module_loading import import_string
+
+# Возможности на версиях областей (posts.versions) в кэше default.
+VERSIONED = ('CONDITIONAL_GET', 'ANONYMOUS_PAGE_CACHE', 'POST_CARD_CACHE')
+
+
+@register(Tags.caches)
+def shared_cache(app_configs, **kwargs):
+    """Версии в LocMemCache не видны другим процессам."""
+    backend = import_string(settings.CACHES['default']['BACKEND'])
+    enabled = [name for name in VERSIONED if getattr(settings, name, False)]
+    if settings.DEBUG or not enabled or not issubclass(backend,
+                                                       LocMemCache):
+        return []
+    return [Warning(
+        f'{", ".join(enabled)} с LocMemCache: изменения в одном процессе '
+        f'не видны другим, они отдают устаревшие 304 и страницы.',
+        hint='Задайте общий кэш (YATUBE_SHARED_CACHE) или выключите '
+             'эти настройки.',
+        id='posts.W001')]
@@ -0,0 +1,115 @@
+"""
+Условные GET (ETag/Last-Modified) и кэш страниц для анонимов по версиям
+областей из posts.versions.
+
+Валидаторы и ключ кэша строятся без основного запроса и рендеринга:
+это одно чтение версий из кэша (и, для некоторых страниц, один запрос
+по индексу, чтобы найти id объекта). Изменение области делает старые
+ETag и записи кэша страниц недействительными.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from core import replicas
+
+from . import versions
+
+
+def version_stamps(request, scopes, *args, **kwargs):
+    """
+    Версии областей страницы, один раз на запрос.
+
+    scopes(request, *args, **kwargs) возвращает список областей или None,
+    если объекта нет.
+    """
+    if not hasattr(request, '_version_stamps'):
+        names = scopes(request, *args, **kwargs)
+        request._version_stamps = (
+            None if names is None
+            else versions.get_many([versions.SITE, *names]))
+        if names is not None and replicas.recent(
+                request._version_stamps.values()):
+            # Реплика могла ещё не получить эти изменения.
+            replicas.use_primary()
+    return request._version_stamps
+
+
+def _digest(parts):
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _stamp_parts(values):
+    return [f'{scope}={stamp!r}' for scope, stamp in sorted(values.items())]
+
+
+def conditional(scopes):
+    """
+    condition() с валидаторами из версий областей scopes.
+
+    Если объекта нет, валидаторов нет и view отдаёт 404. ETag учитывает
+    пользователя и CSRF-cookie: в странице есть его имя и токен форм.
+    Включается настройкой CONDITIONAL_GET.
+    """
+    def etag(request, *args, **kwargs):
+        values = version_stamps(request, scopes, *args, **kwargs)
+        if values is None:
+            return None
+        return _digest([str(request.user.pk),
+                        request.META.get('CSRF_COOKIE', ''),
+                        *_stamp_parts(values)])
+
+    def last_modified(request, *args, **kwargs):
+        values = version_stamps(request, scopes, *args, **kwargs)
+        if values is None:
+            return None
+        return datetime.fromtimestamp(max(values.values()), tz=timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.CONDITIONAL_GET:
+                return view(request, *args, **kwargs)
+            return conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def anonymous_page_cache(scopes):
+    """
+    Кэш готовых страниц для анонимов по пути, параметрам и версиям
+    областей scopes. Вошедшие пользователи всегда получают свежую
+    страницу. Включается настройкой ANONYMOUS_PAGE_CACHE.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (not settings.ANONYMOUS_PAGE_CACHE
+                    or request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            values = version_stamps(request, scopes, *args, **kwargs)
+            if values is None:
+                return view(request, *args, **kwargs)
+            key = 'page:' + _digest([request.get_full_path(),
+                                     *_stamp_parts(values)])
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies):
+                cache.set(key, (response.content, response['Content-Type']),
+                          settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,148 @@
+"""
+Денормализованные счётчики постов и подписок вместо SELECT COUNT(*).
+
+Имена: posts — всего, posts:author:<id>, posts:group:<id>; для графа
+подписок — followers:<id> (подписчики автора) и following:<id>
+(подписки пользователя). Счётчик, которого ещё нет в таблице,
+считается по базе при первом чтении; расхождения исправляет команда
+recount.
+
+Число комментариев хранится прямо в Post.comments_count.
+"""
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Counter, Follow, Post
+
+POSTS = 'posts'
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+
+
+def author_posts(author_id):
+    return f'posts:author:{author_id}'
+
+
+def group_posts(group_id):
+    return f'posts:group:{group_id}'
+
+
+def followers(author_id):
+    return f'{FOLLOWERS}:{author_id}'
+
+
+def following(user_id):
+    return f'{FOLLOWING}:{user_id}'
+
+
+def _source(name):
+    """Queryset, по которому считается счётчик."""
+    kind, _, object_id = name.partition(':')
+    if kind == FOLLOWERS:
+        return Follow.objects.filter(author_id=int(object_id))
+    if kind == FOLLOWING:
+        return Follow.objects.filter(user_id=int(object_id))
+    if kind != POSTS:
+        raise KeyError(name)
+    if not object_id:
+        return Post.objects.all()
+    scope, _, object_id = object_id.partition(':')
+    return Post.objects.filter(**{f'{scope}_id': int(object_id)})
+
+
+def get_many(names, using=None):
+    names = list(dict.fromkeys(names))
+    values = dict(Counter.objects.using(using).filter(
+        name__in=names).values_list('name', 'value'))
+    # Недостающий счётчик сохраняется навсегда: считать по основной базе.
+    missing = [Counter(name=name,
+                       value=_source(name).using(DEFAULT_DB_ALIAS).count())
+               for name in names if name not in values]
+    if missing:
+        Counter.objects.bulk_create(missing, ignore_conflicts=True)
+        values.update((counter.name, counter.value) for counter in missing)
+    return values
+
+
+def get(name):
+    return get_many([name])[name]
+
+
+def incr(names, delta=1):
+    """Атомарно изменить существующие счётчики; отсутствующие посчитаются
+    при чтении."""
+    names = [name for name in names if name]
+    if names:
+        Counter.objects.filter(name__in=names).update(
+            value=F('value') + delta)
+
+
+def post_scopes(author_id, group_id):
+    names = [POSTS, author_posts(author_id)]
+    if group_id is not None:
+        names.append(group_posts(group_id))
+    return names
+
+
+def post_created(post):
+    incr(post_scopes(post.author_id, post.group_id))
+
+
+def post_deleted(post):
+    incr(post_scopes(post.author_id, post.group_id), -1)
+
+
+def post_moved(previous, post):
+    """Перенос поста в другую группу (или к другому автору)."""
+    old = set(post_scopes(*previous)) - {POSTS}
+    new = set(post_scopes(post.author_id, post.group_id)) - {POSTS}
+    incr(old - new, -1)
+    incr(new - old)
+
+
+def follow_changed(user_id, author_id, delta=1):
+    incr([followers(author_id), following(user_id)], delta)
+
+
+def reset(names):
+    """Удалить счётчики: они посчитаются по базе при следующем чтении."""
+    Counter.objects.filter(name__in=list(names)).delete()
+
+
+def comments_changed(post_id, delta=1):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+@transaction.atomic
+def recount():
+    """Пересчитать все счётчики по базе. Возвращает их число."""
+    values = {POSTS: Post.objects.count()}
+    for scope, prefix in (('author', author_posts), ('group', group_posts)):
+        rows = (Post.objects.filter(**{f'{scope}__isnull': False})
+                .values(scope).annotate(total=Count('id'))
+                .values_list(scope, 'total'))
+        values.update((prefix(object_id), total)
+                      for object_id, total in rows)
+    for scope, prefix in (('author', followers), ('user', following)):
+        rows = (Follow.objects.values(scope).annotate(total=Count('id'))
+                .values_list(scope, 'total'))
+        values.update((prefix(object_id), total)
+                      for object_id, total in rows)
+    Counter.objects.filter(name__startswith=POSTS).delete()
+    Counter.objects.filter(name__startswith=FOLLOWERS).delete()
+    Counter.objects.filter(name__startswith=FOLLOWING).delete()
+    Counter.objects.bulk_create(
+        Counter(name=name, value=value) for name, value in values.items())
+    recount_comments()
+    return len(values)
+
+
+def recount_comments(posts=None):
+    """Пересчитать Post.comments_count (всех постов или posts)."""
+    if posts is None:
+        posts = Post.objects.all()
+    total = (Comment.objects.filter(post=OuterRef('pk')).order_by()
+             .values('post').annotate(total=Count('id')).values('total'))
+    posts.update(comments_count=Coalesce(Subquery(total), Value(0)))
@@ -0,0 +1,84 @@
+"""
+Потоковая выгрузка постов и комментариев в NDJSON или JSON.
+
+Записи читаются через QuerySet.iterator() пачками по CHUNK_SIZE и сразу
+сериализуются: память не зависит от числа постов, а первые байты уходят
+до чтения всей выборки. Каждая запись — словарь с полем type
+(post или comment); такой NDJSON принимает команда import_data.
+"""
+import json
+
+from .models import Comment, Post
+
+CHUNK_SIZE = 2000
+# Сколько байт собирать перед отправкой клиенту.
+BUFFER_SIZE = 64 * 1024
+FORMATS = ('ndjson', 'json')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+
+POST_FIELDS = ('id', 'author__username', 'group__slug', 'text', 'pub_date',
+               'image')
+COMMENT_FIELDS = ('id', 'post_id', 'author__username', 'text', 'created')
+
+
+def _scope(author=None, group=None, prefix=''):
+    lookups = {}
+    if author is not None:
+        lookups[f'{prefix}author'] = author
+    if group is not None:
+        lookups[f'{prefix}group'] = group
+    return lookups
+
+
+def records(author=None, group=None, comments=False):
+    """Посты автора и/или группы, затем (по желанию) их комментарии."""
+    posts = (Post.objects.filter(**_scope(author, group))
+             .order_by('id').values_list(*POST_FIELDS))
+    for post_id, username, slug, text, pub_date, image in posts.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield {'type': 'post', 'id': post_id, 'author': username,
+               'group': slug, 'text': text, 'pub_date': pub_date.isoformat(),
+               'image': image or None}
+    if not comments:
+        return
+    rows = (Comment.objects.filter(**_scope(author, group, 'post__'))
+            .order_by('post_id', 'id').values_list(*COMMENT_FIELDS))
+    for comment_id, post_id, username, text, created in rows.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield {'type': 'comment', 'id': comment_id, 'post': post_id,
+               'author': username, 'text': text,
+               'created': created.isoformat()}
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False)
+
+
+def serialize(items, output_format='ndjson'):
+    """Строки выгрузки: NDJSON по записи в строке или JSON-массив."""
+    if output_format == 'ndjson':
+        for record in items:
+            yield _dumps(record) + '\n'
+        return
+    separator = '[\n'
+    for record in items:
+        yield separator + _dumps(record)
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """Склеить мелкие строки в куски около size байт для отправки."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        data = chunk.encode()
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
@@ -0,0 +1,186 @@
+"""
+Материализованная лента подписок (fan-out on write).
+
+Пост автора раскладывается в FeedItem каждого подписчика задачей очереди
+(core.tasks), подписка и отписка — тоже: запрос публикации не ждёт
+вставки строк по числу подписчиков. Пока задача не выполнена, пост или
+подписка отмечены feed_pending, и лента берёт такие посты при чтении.
+Записи ленты без подписки не выводятся, так что отписка видна сразу.
+Авторы, у которых подписчиков не меньше FEED_CELEBRITY_FOLLOWERS,
+не раскладываются: их посты тоже подтягиваются при чтении ленты.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from core.tasks import enqueue
+
+from . import counters
+from .models import Celebrity, FeedItem, Follow, Post
+
+BATCH_SIZE = 1000
+FAN_OUT = 'posts.feed.fan_out'
+ADD_AUTHOR = 'posts.feed.add_author'
+REMOVE_AUTHOR = 'posts.feed.remove_author'
+
+
+def celebrity_threshold():
+    return getattr(settings, 'FEED_CELEBRITY_FOLLOWERS', None)
+
+
+def compute_celebrities():
+    """Авторы с числом подписчиков не меньше порога (из базы)."""
+    threshold = celebrity_threshold()
+    if not threshold:
+        return set()
+    return set(
+        Follow.objects.values('author')
+        .annotate(followers=Count('id'))
+        .filter(followers__gte=threshold)
+        .values_list('author', flat=True)
+    )
+
+
+def celebrities():
+    return set(Celebrity.objects.values_list('author_id', flat=True))
+
+
+def mark_celebrities(author_ids):
+    Celebrity.objects.bulk_create(
+        [Celebrity(author_id=author_id) for author_id in author_ids],
+        ignore_conflicts=True)
+
+
+def refresh_celebrities(replace=True):
+    """
+    Пересчитать «знаменитостей» по порогу. Заменять множество можно только
+    вместе с полной пересборкой лент: посты выбывших надо разложить.
+    """
+    ids = compute_celebrities()
+    if replace:
+        Celebrity.objects.exclude(author_id__in=ids).delete()
+    mark_celebrities(ids)
+    return celebrities()
+
+
+def is_celebrity(author_id):
+    """
+    Решение о fan-out принимается по точному числу подписчиков.
+
+    Отметка хранится в базе (Celebrity) и снимается только полной
+    пересборкой backfill_feed, иначе неразложенные посты автора пропадут
+    из лент.
+    """
+    if Celebrity.objects.filter(author_id=author_id).exists():
+        return True
+    threshold = celebrity_threshold()
+    if not threshold:
+        return False
+    if counters.get(counters.followers(author_id)) < threshold:
+        return False
+    mark_celebrities([author_id])
+    return True
+
+
+def _insert(items):
+    # SQLite ограничивает число строк в одном INSERT; Django 2.2 не урезает
+    # явно заданный batch_size сам.
+    fields = ('user_id', 'post_id', 'author_id')
+    batch_size = min(BATCH_SIZE, connection.ops.bulk_batch_size(
+        fields, [None] * BATCH_SIZE))
+    FeedItem.objects.bulk_create(items, batch_size=batch_size,
+                                 ignore_conflicts=True)
+
+
+def fan_out_post(post_id):
+    """Разложить пост по лентам подписчиков автора."""
+    author_id = Post.objects.filter(id=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return
+    if not is_celebrity(author_id):
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+        _insert(FeedItem(user_id=user_id, post_id=post_id,
+                         author_id=author_id)
+                for user_id in followers.iterator())
+    Post.objects.filter(id=post_id).update(feed_pending=False)
+
+
+@transaction.atomic
+def add_author_to_feed(user_id, author_id):
+    """Подписка: перенести в ленту уже опубликованные посты автора."""
+    follow = Follow.objects.filter(user_id=user_id, author_id=author_id)
+    if not follow.exists():
+        return
+    if not is_celebrity(author_id):
+        posts = Post.objects.filter(
+            author_id=author_id).values_list('id', flat=True)
+        _insert(FeedItem(user_id=user_id, post_id=post_id,
+                         author_id=author_id)
+                for post_id in posts.iterator())
+    follow.update(feed_pending=False)
+
+
+@transaction.atomic
+def remove_author_from_feed(user_id, author_id):
+    """Отписка: удалить посты автора из ленты, если не подписался снова."""
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        return
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def schedule_fan_out(post_id):
+    enqueue(FAN_OUT, post_id, key=f'{FAN_OUT}:{post_id}')
+
+
+def schedule_follow(user_id, author_id):
+    enqueue(ADD_AUTHOR, user_id, author_id,
+            key=f'{ADD_AUTHOR}:{user_id}:{author_id}')
+
+
+def schedule_unfollow(user_id, author_id):
+    enqueue(REMOVE_AUTHOR, user_id, author_id,
+            key=f'{REMOVE_AUTHOR}:{user_id}:{author_id}')
+
+
+def follow_feed(user):
+    """
+    Посты ленты подписок: из FeedItem и при чтении — от «знаменитостей»,
+    от авторов с ещё не перенесённой подпиской и ещё не разложенные.
+    """
+    follows = Follow.objects.filter(user=user)
+    authors = follows.values('author_id')
+    inbox = FeedItem.objects.filter(
+        user=user, author_id__in=authors).values('post_id')
+    pulled = follows.filter(
+        Q(feed_pending=True)
+        | Q(author_id__in=Celebrity.objects.values('author_id')),
+    ).values('author_id')
+    return Post.objects.filter(
+        Q(id__in=inbox) | Q(author_id__in=pulled)
+        | Q(author_id__in=authors, feed_pending=True))
+
+
+def backfill(users=None):
+    """
+    Пересобрать ленты: удалить записи без подписки, добавить недостающие.
+
+    Возвращает число обработанных подписок.
+    """
+    refresh_celebrities(replace=users is None)
+    follows = Follow.objects.all()
+    items = FeedItem.objects.all()
+    if users is not None:
+        follows = follows.filter(user__in=users)
+        items = items.filter(user__in=users)
+    stale = items.annotate(followed=Exists(Follow.objects.filter(
+        user_id=OuterRef('user_id'), author_id=OuterRef('author_id'))
+    )).filter(followed=False).values_list('id', flat=True)
+    FeedItem.objects.filter(id__in=list(stale)).delete()
+    processed = 0
+    for user_id, author_id in follows.values_list(
+            'user_id', 'author_id').iterator():
+        add_author_to_feed(user_id, author_id)
+        processed += 1
+    return processed
@@ -0,0 +1,154 @@
+"""
+Граф подписок: число подписчиков и подписок, проверка «подписан ли
+читатель на этих авторов» пачкой и рекомендации авторов.
+
+Числа берутся из счётчиков posts.counters (followers:<id>,
+following:<id>): COUNT по таблице подписок не нужен, сколько бы
+подписчиков ни было у автора. Проверка подписок — один запрос по
+уникальному индексу (user, author) на всю страницу. Рекомендации —
+авторы, на которых подписаны авторы читателя (друзья друзей); источники
+ограничены SUGGESTION_SOURCES последними подписками, результат
+кэшируется под версией follows:<id> читателя.
+
+Подписка и отписка — по одному оператору SQL (INSERT с пропуском
+конфликта и DELETE): повтор и гонка двух запросов безопасны, дубликат
+отсекает уникальное ограничение Follow. Модель при этом не сохраняется,
+сигналов нет: follow_created/follow_removed вызываются напрямую и только
+при реальном изменении. Их же вызывают сигналы Follow (posts.signals),
+когда подписку сохраняют через ORM.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+
+from . import authors, counters, feed, versions
+from .models import Counter, Follow
+
+SUGGESTIONS = 5
+SUGGESTION_SOURCES = 200
+SUGGESTIONS_TIMEOUT = 60 * 60
+
+
+def counts(user_id):
+    """{'followers': подписчики, 'following': подписки} пользователя."""
+    names = {'followers': counters.followers(user_id),
+             'following': counters.following(user_id)}
+    values = counters.get_many(names.values())
+    return {key: values[name] for key, name in names.items()}
+
+
+def followed(user, author_ids):
+    """Те из author_ids, на кого подписан user, — одним запросом."""
+    author_ids = set(author_ids)
+    if not user.is_authenticated or not author_ids:
+        return set()
+    return set(Follow.objects.filter(
+        user_id=user.pk, author_id__in=author_ids,
+    ).values_list('author_id', flat=True))
+
+
+def is_following(user, author_id):
+    return author_id in followed(user, [author_id])
+
+
+def mark_followed(user, posts):
+    """post.author_followed для карточек страницы."""
+    posts = list(posts)
+    ids = followed(user, {post.author_id for post in posts})
+    for post in posts:
+        post.author_followed = post.author_id in ids
+    return posts
+
+
+def follow_changed(user_id, author_id):
+    """Подписки читателя и число подписчиков автора."""
+    authors.invalidate(author_id, user_id)
+    versions.bump(f'follows:{user_id}', f'followers:{author_id}')
+
+
+def follow_created(user_id, author_id):
+    """Новая подписка: из follow или из сигнала Follow."""
+    counters.follow_changed(user_id, author_id)
+    feed.schedule_follow(user_id, author_id)
+    follow_changed(user_id, author_id)
+
+
+def follow_removed(user_id, author_id):
+    """Отписка: из unfollow или из сигнала Follow."""
+    counters.follow_changed(user_id, author_id, -1)
+    feed.schedule_unfollow(user_id, author_id)
+    follow_changed(user_id, author_id)
+
+
+def _execute(sql, params):
+    """Выполнить оператор над таблицей подписок; число затронутых строк."""
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=table), params)
+        return cursor.rowcount
+
+
+@transaction.atomic
+def follow(user_id, author_id):
+    """Подписать user_id на author_id. True, если подписки не было."""
+    ops = connection.ops
+    created = _execute(
+        ops.insert_statement(ignore_conflicts=True)
+        + ' {table} (user_id, author_id, feed_pending) VALUES (%s, %s, %s)'
+        + ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        [user_id, author_id, True]) > 0
+    if created:
+        follow_created(user_id, author_id)
+    return created
+
+
+@transaction.atomic
+def unfollow(user_id, author_id):
+    """Отписать user_id от author_id. True, если подписка была."""
+    deleted = _execute(
+        'DELETE FROM {table} WHERE user_id = %s AND author_id = %s',
+        [user_id, author_id]) > 0
+    if deleted:
+        follow_removed(user_id, author_id)
+    return deleted
+
+
+def _friends_of_friends(user_id, limit):
+    sources = (Follow.objects.filter(user_id=user_id).order_by('-id')
+               .values('author_id')[:SUGGESTION_SOURCES])
+    return list(
+        Follow.objects.filter(user_id__in=sources)
+        .exclude(author_id=user_id)
+        .exclude(author_id__in=Follow.objects.filter(
+            user_id=user_id).values('author_id'))
+        .values('author_id').annotate(common=Count('id'))
+        .order_by('-common', 'author_id')
+        .values_list('author_id', flat=True)[:limit])
+
+
+def _popular(user, exclude, limit):
+    """Авторы с наибольшим числом подписчиков по счётчикам."""
+    names = (Counter.objects.filter(name__startswith=counters.FOLLOWERS + ':')
+             .order_by('-value').values_list('name', flat=True)
+             [:limit + len(exclude) + 1])
+    candidates = [int(name.partition(':')[2]) for name in names]
+    candidates = [author_id for author_id in candidates
+                  if author_id not in exclude and author_id != user.pk]
+    mine = followed(user, candidates)
+    return [author_id for author_id in candidates
+            if author_id not in mine][:limit]
+
+
+def suggestions(user, limit=SUGGESTIONS):
+    """id рекомендуемых авторов: сначала друзья друзей, затем популярные."""
+    if not user.is_authenticated:
+        return []
+    stamp = versions.get(f'follows:{user.pk}')
+    key = f'follows:suggestions:{user.pk}:{limit}:{stamp!r}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = _friends_of_friends(user.pk, limit)
+        if len(ids) < limit:
+            ids += _popular(user, set(ids), limit - len(ids))
+        cache.set(key, ids, SUGGESTIONS_TIMEOUT)
+    return ids
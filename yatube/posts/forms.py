@@ -1,6 +1,9 @@
 from django import forms
 
+from django.core.files.uploadedfile import UploadedFile
+
 from .models import Post, Comment
+from .uploadhandlers import RejectedUpload, normalize_image
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +11,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файлы, отклонённые ImageUploadHandler ещё при загрузке.
+        self.upload_errors = {
+            name: upload.reason for name, upload in self.files.items()
+            if isinstance(upload, RejectedUpload)
+        }
+        if self.upload_errors:
+            self.files = self.files.copy()
+            for name in self.upload_errors:
+                del self.files[name]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, reason in self.upload_errors.items():
+            self.add_error(name, reason)
+        return cleaned_data
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
     def clean_text(self):
         data = self.cleaned_data['text']
         if len(data) < 10:
@@ -0,0 +1,56 @@
+"""
+Кэш отрендеренных карточек постов.
+
+Ключ карточки содержит версии поста, автора и группы, поэтому
+правка поста, смена группы или имени автора сразу дают новый ключ.
+Страница ленты собирается двумя multi-get: версии и карточки.
+Включается настройкой POST_CARD_CACHE.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import replicas
+
+from . import versions
+
+CARD_TEMPLATE = 'includes/post.html'
+
+
+def card_scopes(post):
+    scopes = [f'post:{post.id}', f'user:{post.author_id}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group_id}')
+    return scopes
+
+
+def card_key(post, template, known):
+    stamp = ':'.join(repr(known[scope]) for scope in card_scopes(post))
+    return f'card:{template}:{post.id}:{stamp}'
+
+
+def render_cards(page, template=CARD_TEMPLATE):
+    """Записать в post.card HTML карточки для каждого поста страницы."""
+    page.object_list = posts = list(page.object_list)
+    if not settings.POST_CARD_CACHE:
+        for post in posts:
+            post.card = mark_safe(render_to_string(template, {'post': post}))
+        return page
+    if not posts:
+        return page
+    known = versions.get_many(
+        {scope for post in posts for scope in card_scopes(post)})
+    keys = {post.id: card_key(post, template, known) for post in posts}
+    cached = cache.get_many(list(keys.values()))
+    fresh = {}
+    for post in posts:
+        html = cached.get(keys[post.id])
+        if html is None:
+            html = fresh[keys[post.id]] = render_to_string(
+                template, {'post': post})
+        post.card = mark_safe(html)
+    # Карточки по данным отстающей реплики в кэш не попадают.
+    if fresh and not replicas.recent(known.values()):
+        cache.set_many(fresh, settings.POST_CARD_CACHE_TIMEOUT)
+    return page
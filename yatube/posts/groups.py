@@ -0,0 +1,84 @@
+"""
+Реестр групп: все группы по id и slug без запросов к таблице Group.
+
+Групп мало, и меняются они редко, поэтому реестр хранится целиком:
+в общем кэше под версией области groups и в памяти процесса. Каждое
+обращение сверяет версию (одно чтение из кэша); сохранение или
+удаление группы меняет версию, и все процессы перечитывают реестр.
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from . import versions
+from .models import Group, Post
+
+SCOPE = 'groups'
+FIELDS = ('id', 'slug', 'title', 'description')
+
+# (версия, группы по id, группы по slug) — общий для потоков процесса.
+_snapshot = (None, {}, {})
+
+
+def _key(stamp):
+    return f'groups:registry:{stamp!r}'
+
+
+def _load():
+    # Реестр кэшируется под версией: читать основную базу, не реплику.
+    return list(Group.objects.using(DEFAULT_DB_ALIAS).order_by('id')
+                .values_list(*FIELDS))
+
+
+def _rows():
+    global _snapshot
+    stamp = versions.get(SCOPE)
+    if _snapshot[0] == stamp:
+        return _snapshot[1:]
+    rows = cache.get(_key(stamp))
+    if rows is None:
+        rows = _load()
+        cache.set(_key(stamp), rows, None)
+    _snapshot = (stamp, {row[0]: row for row in rows},
+                 {row[1]: row for row in rows})
+    return _snapshot[1:]
+
+
+def _group(row):
+    group = Group(**dict(zip(FIELDS, row)))
+    group._state.adding = False
+    group._state.db = 'default'
+    return group
+
+
+def get(group_id):
+    """Группа по id или None."""
+    row = _rows()[0].get(group_id)
+    return None if row is None else _group(row)
+
+
+def get_by_slug(slug):
+    """Группа по slug или None."""
+    row = _rows()[1].get(slug)
+    return None if row is None else _group(row)
+
+
+def attach(posts):
+    """
+    Подставить постам группы из реестра, чтобы post.group не шёл в базу.
+    Генератор: посты можно передавать по одному из итератора запроса.
+    """
+    by_id = _rows()[0]
+    field = Post._meta.get_field('group')
+    for post in posts:
+        if post.group_id is None:
+            field.set_cached_value(post, None)
+        elif post.group_id in by_id:
+            field.set_cached_value(post, _group(by_id[post.group_id]))
+        yield post
+
+
+def flush():
+    """Перечитать реестр из базы при следующем обращении."""
+    global _snapshot
+    versions.bump(SCOPE)
+    _snapshot = (None, {}, {})
@@ -0,0 +1,288 @@
+"""
+Массовый импорт пользователей, групп, постов, комментариев и подписок.
+
+Записи (словари с полем type, как в posts.export) копятся пачками по
+типам и вставляются bulk_create, каждая пачка — в своей транзакции.
+Перед пачкой вставляются накопленные пачки типов, от которых она
+зависит (ORDER), так что ссылки на ещё не вставленные строки
+разрешаются. Внешние ключи ищутся в словарях в памяти: имя
+пользователя, slug группы и id поста в источнике.
+
+Строки вставляются как есть (bulk.create_as_is): даты pub_date и
+created не подменяются текущим временем.
+Сигналы не вызываются: счётчики, поиск и ленты пересчитываются
+в finish() — только затронутые импортом (авторы и группы новых постов,
+подписчики их авторов, новые подписки), чтобы небольшой импорт в
+большую базу не стоил полной пересборки. Полная — с rebuild=True.
+"""
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import authors, bulk, counters, feed, search, versions
+from .models import Comment, Follow, Group, Post, User
+
+ORDER = ('user', 'group', 'post', 'comment', 'follow')
+LOOKUP_CHUNK = 500
+
+
+def chunks(items, size=LOOKUP_CHUNK):
+    """Списки по size элементов: столько параметров в одном IN."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RecordError(ValueError):
+    """Запись, которую нельзя импортировать."""
+
+
+class KeyMap:
+    """Ключ источника -> id в базе; недостающие ищутся в базе пачками."""
+
+    def __init__(self, model=None, field=None):
+        self.model = model
+        self.field = field
+        self.ids = {}
+
+    def load(self, keys):
+        if self.model is None:
+            return
+        missing = {key for key in keys if key and key not in self.ids}
+        for chunk in chunks(missing):
+            self.ids.update(self.model.objects.filter(
+                **{f'{self.field}__in': chunk}).values_list(self.field, 'id'))
+
+    def get(self, key, required=True):
+        if not key:
+            if required:
+                raise RecordError('пустая ссылка')
+            return None
+        try:
+            return self.ids[key]
+        except KeyError:
+            raise RecordError(f'не найден {key!r}')
+
+
+def parse_date(value, default):
+    if not value:
+        return default
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        # Формат верный, но значения вне диапазона: 2020-13-45.
+        moment = None
+    if moment is None:
+        raise RecordError(f'дата {value!r}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Importer:
+
+    def __init__(self, batch_size=1000, log=None):
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.pending = {kind: [] for kind in ORDER}
+        self.created = dict.fromkeys(ORDER, 0)
+        self.errors = 0
+        self.users = KeyMap(User, 'username')
+        self.groups = KeyMap(Group, 'slug')
+        # id поста в источнике -> id в базе: только посты этого импорта.
+        self.posts = KeyMap()
+        self.next_post_id = None
+        # Что затронул импорт: для пересчёта в finish().
+        self.first_post_id = None
+        self.post_scopes = set()
+        self.follows = set()
+        self.password = make_password(None)
+        self.now = timezone.now()
+        self.started = time.monotonic()
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in self.pending:
+            self.error(record, f'неизвестный тип {kind!r}')
+            return
+        self.pending[kind].append(record)
+        if len(self.pending[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def error(self, record, reason):
+        self.errors += 1
+        self.log(f'Пропущена запись {record}: {reason}')
+
+    def flush(self, kind=None):
+        """Вставить пачку kind и всё, от чего она зависит (или всё)."""
+        last = ORDER.index(kind) if kind else len(ORDER) - 1
+        for name in ORDER[:last + 1]:
+            records, self.pending[name] = self.pending[name], []
+            if records:
+                with transaction.atomic():
+                    getattr(self, f'_insert_{name}s')(records)
+
+    def _build(self, records, build):
+        objects = []
+        for record in records:
+            try:
+                objects.append(build(record))
+            except (RecordError, KeyError, TypeError) as error:
+                self.error(record, error)
+        return objects
+
+    def _insert(self, kind, model, objects):
+        bulk.create_as_is(model, objects)
+        self.created[kind] += len(objects)
+        self.log(f'{kind}: +{len(objects)}, {self.rate():.0f} строк/с')
+
+    def _new(self, records, keys, field):
+        """Записи с ключом field, которого ещё нет ни в базе, ни выше."""
+        keys.load(record.get(field) for record in records)
+        seen = set()
+        for record in records:
+            key = record.get(field)
+            if key in keys.ids or key in seen:
+                continue
+            seen.add(key)
+            yield record
+
+    def _insert_users(self, records):
+        objects = self._build(self._new(records, self.users, 'username'),
+                              self._user)
+        self._insert('user', User, objects)
+        self.users.load(user.username for user in objects)
+
+    def _user(self, record):
+        return User(username=record['username'], password=self.password,
+                    first_name=record.get('first_name') or '',
+                    last_name=record.get('last_name') or '',
+                    email=record.get('email') or '',
+                    date_joined=parse_date(record.get('date_joined'),
+                                           self.now))
+
+    def _insert_groups(self, records):
+        objects = self._build(self._new(records, self.groups, 'slug'),
+                              self._group)
+        self._insert('group', Group, objects)
+        self.groups.load(group.slug for group in objects)
+
+    @staticmethod
+    def _group(record):
+        return Group(slug=record['slug'],
+                     title=record.get('title') or record['slug'],
+                     description=record.get('description') or '')
+
+    def _insert_posts(self, records):
+        self.users.load(record.get('author') for record in records)
+        self.groups.load(record.get('group') for record in records)
+        if self.next_post_id is None:
+            self.next_post_id = (Post.objects.aggregate(
+                last=Max('id'))['last'] or 0) + 1
+            self.first_post_id = self.next_post_id
+        # id задаются заранее: bulk_create на SQLite их не возвращает,
+        # а комментариям нужны id вставленных постов.
+        objects = self._build(records, self._post)
+        self._insert('post', Post, objects)
+        self.post_scopes.update((post.author_id, post.group_id)
+                                for post in objects)
+        for post in objects:
+            source_id = post._source_id
+            if source_id is not None:
+                self.posts.ids[str(source_id)] = post.id
+
+    def _post(self, record):
+        post = Post(
+            id=self.next_post_id,
+            author_id=self.users.get(record.get('author')),
+            group_id=self.groups.get(record.get('group'), required=False),
+            text=record['text'],
+            pub_date=parse_date(record.get('pub_date'), self.now),
+            image=record.get('image') or '')
+        post._source_id = record.get('id')
+        self.next_post_id += 1
+        return post
+
+    def _insert_comments(self, records):
+        self.users.load(record.get('author') for record in records)
+        self._insert('comment', Comment, self._build(records, self._comment))
+
+    def _comment(self, record):
+        return Comment(post_id=self.posts.get(str(record.get('post') or '')),
+                       author_id=self.users.get(record.get('author')),
+                       text=record['text'],
+                       created=parse_date(record.get('created'), self.now))
+
+    def _insert_follows(self, records):
+        self.users.load(record.get(field) for record in records
+                        for field in ('user', 'author'))
+        pairs = {(follow.user_id, follow.author_id)
+                 for follow in self._build(records, self._follow)
+                 if follow.user_id != follow.author_id}
+        # Два IN на пачку: не больше LOOKUP_CHUNK параметров вместе.
+        for chunk in chunks(pairs, LOOKUP_CHUNK // 2):
+            pairs -= set(Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in chunk},
+                author_id__in={author_id for _, author_id in chunk},
+            ).values_list('user_id', 'author_id'))
+        self._insert('follow', Follow, [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs])
+        self.follows |= pairs
+
+    def _follow(self, record):
+        return Follow(user_id=self.users.get(record.get('user')),
+                      author_id=self.users.get(record.get('author')))
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return sum(self.created.values()) / elapsed if elapsed else 0.0
+
+    def refresh(self, rebuild_feed=True):
+        """Пересчитать счётчики, поиск и ленты, затронутые импортом."""
+        names = set()
+        for author_id, group_id in self.post_scopes:
+            names.update(counters.post_scopes(author_id, group_id))
+        for user_id, author_id in self.follows:
+            names.update((counters.followers(author_id),
+                          counters.following(user_id)))
+        for chunk in chunks(names):
+            counters.reset(chunk)
+        if self.first_post_id is not None:
+            # Комментарии импортируются только к постам этого импорта.
+            counters.recount_comments(
+                Post.objects.filter(id__gte=self.first_post_id))
+            search.index_since(self.first_post_id)
+        if not rebuild_feed:
+            return
+        users = {user_id for user_id, _ in self.follows}
+        for chunk in chunks({author_id for author_id, _ in self.post_scopes}):
+            users.update(Follow.objects.filter(
+                author_id__in=chunk).values_list('user_id', flat=True))
+        for chunk in chunks(users):
+            feed.backfill(users=chunk)
+
+    def finish(self, rebuild_feed=True, rebuild=False):
+        """
+        Вставить остатки и пересчитать то, что обычно делают сигналы:
+        затронутое импортом или, с rebuild, всё.
+        """
+        self.flush()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Post]):
+                cursor.execute(sql)
+        if rebuild:
+            counters.recount()
+            search.rebuild()
+            if rebuild_feed:
+                feed.backfill()
+        else:
+            self.refresh(rebuild_feed)
+        authors.invalidate(*self.users.ids.values())
+        versions.bump(versions.SITE, versions.FEED)
+        return time.monotonic() - self.started
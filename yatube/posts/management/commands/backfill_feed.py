@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать материализованные ленты подписок (FeedItem).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='Только ленты этих пользователей (можно повторять).')
+
+    def handle(self, *args, usernames, **options):
+        users = None
+        if usernames:
+            users = User.objects.filter(username__in=usernames)
+        processed = feed.backfill(users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписок обработано: {processed}, '
+            f'авторов без fan-out: {len(feed.celebrities())}'))
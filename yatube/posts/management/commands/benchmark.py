@@ -0,0 +1,152 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metrics import PERCENTILES, percentile
+from posts.models import Comment, Follow, Group, Post, User
+
+READS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+WRITES = ('post_create', 'add_comment')
+
+
+class Command(BaseCommand):
+    help = ('Прогнать ленты и формы через тестовый клиент и вывести '
+            'перцентили задержки и число запросов в JSON. Записи '
+            'откатываются, база не меняется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Запросов на каждый сценарий.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Запросов прогрева, не входят в отчёт.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            choices=READS + WRITES,
+                            help='Только эти сценарии (можно повторять).')
+        parser.add_argument('--user', help='Читатель; по умолчанию '
+                                           'пользователь с большим числом '
+                                           'подписок.')
+        parser.add_argument('--pages', type=int, default=5,
+                            help='Из скольких первых страниц выбирать.')
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def reader(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = (User.objects.annotate(follows=Count('follower'))
+                    .order_by('-follows', 'id').first())
+        if user is None:
+            raise CommandError('Нет пользователей: запустите generate_data.')
+        return user
+
+    @staticmethod
+    def sample(queryset, field, size=100):
+        """Значения поля у последних записей, без полного просмотра."""
+        return list(queryset.order_by('-id').values_list(field, flat=True)
+                    [:size]) or ['-']
+
+    def requests(self, name):
+        """Метод, url и данные одного запроса сценария."""
+        page = {'page': random.randint(1, self.pages)}
+        if name == 'index':
+            return 'get', reverse('posts:index'), page
+        if name == 'group_posts':
+            return 'get', reverse('posts:posts_group',
+                                  args=[random.choice(self.groups)]), page
+        if name == 'profile':
+            return 'get', reverse('posts:profile',
+                                  args=[random.choice(self.authors)]), page
+        if name == 'post_detail':
+            return 'get', reverse('posts:post_detail',
+                                  args=[random.choice(self.posts)]), {}
+        if name == 'follow_index':
+            return 'get', reverse('posts:follow_index'), page
+        if name == 'post_create':
+            return 'post', reverse('posts:post_create'), {
+                'text': f'Нагрузочный пост {time.time()}'}
+        return 'post', reverse('posts:add_comment',
+                               args=[random.choice(self.posts)]), {
+            'text': 'Нагрузочный комментарий'}
+
+    def call(self, client, name):
+        method, url, data = self.requests(name)
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                elapsed = time.perf_counter() - start
+                # Записи не сохраняются: база остаётся прежней.
+                transaction.set_rollback(True)
+        return response.status_code, elapsed * 1000, len(queries)
+
+    def run(self, client, name, count, warmup):
+        for _ in range(warmup):
+            self.call(client, name)
+        latency, queries, statuses = [], [], {}
+        for _ in range(count):
+            status, elapsed, total = self.call(client, name)
+            latency.append(elapsed)
+            queries.append(total)
+            statuses[status] = statuses.get(status, 0) + 1
+        latency.sort()
+        queries.sort()
+        summary = {f'p{rank}': round(percentile(latency, rank), 2)
+                   for rank in PERCENTILES}
+        summary['max'] = round(latency[-1], 2)
+        return {
+            'requests': count,
+            'status': {str(code): n for code, n in sorted(statuses.items())},
+            'latency_ms': summary,
+            'queries': {'p50': percentile(queries, 50), 'max': queries[-1]},
+        }
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля.')
+        random.seed(options['seed'])
+        user = self.reader(options['user'])
+        self.pages = options['pages']
+        self.groups = self.sample(Group.objects, 'slug')
+        # Авторы последних постов: популярные попадаются чаще.
+        self.authors = self.sample(Post.objects, 'author__username')
+        self.posts = self.sample(Post.objects, 'id')
+        client = Client()
+        client.force_login(user)
+
+        scenarios = {}
+        for name in options['scenarios'] or READS + WRITES:
+            self.stderr.write(f'{name}...')
+            scenarios[name] = self.run(client, name, options['requests'],
+                                       options['warmup'])
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'reader': user.username,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+                'reader_follows': Follow.objects.filter(user=user).count(),
+            },
+            'scenarios': scenarios,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f'Отчёт записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
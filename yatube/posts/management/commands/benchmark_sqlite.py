@@ -0,0 +1,198 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core import sqlite
+from core.metrics import PERCENTILES, percentile
+from posts.models import Comment, Post
+
+ALIAS = 'benchmark'
+# Настройки SQLite по умолчанию: журнал с откатом, synchronous=FULL,
+# кэш 2000 КиБ, без mmap; соединение открывается на каждый запрос.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+}
+CONFIGS = {
+    'default': {'pragmas': DEFAULT_PRAGMAS, 'persistent': False},
+    # Прагмы из настроек (core.sqlite).
+    'tuned': {'pragmas': None, 'persistent': True},
+}
+
+
+class Command(BaseCommand):
+    help = ('Смешанная нагрузка чтения и записи из нескольких потоков на '
+            'копии базы SQLite: настройки по умолчанию против core.sqlite '
+            '(WAL, прагмы, постоянные соединения). Отчёт — JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Секунд нагрузки на каждую конфигурацию.')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Доля записей среди операций.')
+        parser.add_argument('--config', action='append', dest='configs',
+                            choices=tuple(CONFIGS),
+                            help='Только эти конфигурации.')
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    # Операции: те же запросы, что у лент, поста и форм, без сигналов.
+
+    def read_feed(self, rng):
+        offset = rng.randrange(5) * settings.PAGE_COUNT
+        list(Post.objects.using(ALIAS).select_related('author')
+             .order_by('-pub_date')[offset:offset + settings.PAGE_COUNT])
+
+    def read_post(self, rng):
+        post_id = rng.choice(self.posts)
+        Post.objects.using(ALIAS).select_related('author').get(id=post_id)
+        list(Comment.objects.using(ALIAS).select_related('author')
+             .filter(post_id=post_id)
+             .order_by('-created')[:settings.COMMENTS_PER_PAGE])
+
+    def post_create(self, rng):
+        Post.objects.using(ALIAS).bulk_create([Post(
+            author_id=rng.choice(self.authors),
+            text=f'Нагрузочный пост {time.time()}')])
+
+    def add_comment(self, rng):
+        post_id = rng.choice(self.posts)
+        with transaction.atomic(using=ALIAS):
+            Comment.objects.using(ALIAS).bulk_create([Comment(
+                post_id=post_id, author_id=rng.choice(self.authors),
+                text='Нагрузочный комментарий')])
+            Post.objects.using(ALIAS).filter(id=post_id).update(
+                comments_count=F('comments_count') + 1)
+
+    def worker(self, seed, deadline, persistent, results):
+        rng = random.Random(seed)
+        reads, writes = (self.read_feed, self.read_post), (
+            self.post_create, self.add_comment)
+        latency, counts = [], {'reads': 0, 'writes': 0, 'errors': 0}
+        while time.monotonic() < deadline:
+            write = rng.random() < self.write_ratio
+            operation = rng.choice(writes if write else reads)
+            start = time.perf_counter()
+            try:
+                operation(rng)
+            except OperationalError:
+                counts['errors'] += 1
+            else:
+                counts['writes' if write else 'reads'] += 1
+                latency.append((time.perf_counter() - start) * 1000)
+            if not persistent:
+                connections[ALIAS].close()
+        connections[ALIAS].close()
+        results.append((latency, counts))
+
+    def copy_database(self, source):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        original, copy = sqlite3.connect(source), sqlite3.connect(path)
+        try:
+            original.backup(copy)
+        finally:
+            original.close()
+            copy.close()
+        return path
+
+    def run(self, name, source):
+        config = CONFIGS[name]
+        path = self.copy_database(source)
+        connections.databases[ALIAS] = {
+            **settings.DATABASES['default'], 'NAME': path}
+        try:
+            overrides = ({} if config['pragmas'] is None
+                         else {'SQLITE_PRAGMAS': config['pragmas']})
+            with override_settings(**overrides):
+                applied = sqlite.apply(connections[ALIAS])
+                connections[ALIAS].close()
+                results, threads = [], []
+                deadline = time.monotonic() + self.duration
+                for number in range(self.threads):
+                    thread = threading.Thread(target=self.worker, args=(
+                        self.seed + number, deadline, config['persistent'],
+                        results))
+                    threads.append(thread)
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.databases[ALIAS]
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        latency = sorted(value for values, _ in results for value in values)
+        totals = {key: sum(counts[key] for _, counts in results)
+                  for key in ('reads', 'writes', 'errors')}
+        done = totals['reads'] + totals['writes']
+        summary = {f'p{rank}': round(percentile(latency, rank), 2)
+                   for rank in PERCENTILES} if latency else {}
+        return {
+            'pragmas': applied,
+            'persistent_connections': config['persistent'],
+            **totals,
+            'ops_per_sec': round(done / self.duration, 1),
+            'latency_ms': summary,
+        }
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']
+        if source['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Команда сравнивает настройки SQLite.')
+        if options['threads'] < 1 or options['duration'] <= 0:
+            raise CommandError('--threads и --duration должны быть '
+                               'больше нуля.')
+        self.threads = options['threads']
+        self.duration = options['duration']
+        self.write_ratio = options['write_ratio']
+        self.seed = (options['seed'] if options['seed'] is not None
+                     else random.randrange(2 ** 32))
+        self.posts = list(Post.objects.order_by('-id')
+                          .values_list('id', flat=True)[:1000])
+        self.authors = list(Post.objects.order_by('-id')
+                            .values_list('author_id', flat=True)[:1000])
+        if not self.posts:
+            raise CommandError('Нет постов: запустите generate_data.')
+
+        configs = {}
+        for name in options['configs'] or tuple(CONFIGS):
+            self.stderr.write(f'{name}...')
+            configs[name] = self.run(name, source['NAME'])
+        report = {
+            'created': timezone.now().isoformat(),
+            'threads': self.threads,
+            'duration_s': self.duration,
+            'write_ratio': self.write_ratio,
+            'configs': configs,
+        }
+        if {'default', 'tuned'} <= set(configs) and configs['default'][
+                'ops_per_sec']:
+            report['speedup'] = round(configs['tuned']['ops_per_sec']
+                                      / configs['default']['ops_per_sec'], 2)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f'Отчёт записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,85 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from posts import counters
+from posts.feed import follow_feed
+from posts.models import Comment, Counter, Follow, Group, Post, User
+
+# Полный просмотр таблицы (SQLite и PostgreSQL) и сортировка без индекса.
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+$|Seq Scan')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR ORDER BY|\bSort\b')
+
+
+class Command(BaseCommand):
+    help = ('Показать планы (EXPLAIN QUERY PLAN) запросов лент и отметить '
+            'полные просмотры таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Читатель ленты подписок.')
+        parser.add_argument('--group', help='Slug группы.')
+        parser.add_argument('--post', type=int, help='id поста.')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Завершиться с ошибкой при полном '
+                                 'просмотре таблицы.')
+
+    def sample(self, options):
+        """Пользователь, группа и пост для подстановки в запросы."""
+        user = (User.objects.filter(username=options['user']).first()
+                if options['user'] else User.objects.first())
+        group = (Group.objects.filter(slug=options['group']).first()
+                 if options['group'] else Group.objects.first())
+        post_id = options['post'] or (
+            Post.objects.values_list('id', flat=True).first() or 1)
+        return (user or User(id=1, username='user'),
+                group or Group(id=1, slug='group'), post_id)
+
+    def queries(self, user, group, post_id):
+        page = settings.PAGE_COUNT
+        now = timezone.now()
+        keyset = Q(pub_date__lt=now) | Q(pub_date=now, id__lt=post_id)
+        cursor_page = (Post.objects.for_feed().filter(keyset)
+                       .order_by('-pub_date', '-id'))
+        return (
+            ('index: страница', Post.objects.for_feed()[:page]),
+            ('index: курсор', cursor_page[:page + 1]),
+            ('счётчики', Counter.objects.filter(name__in=[
+                counters.POSTS, counters.author_posts(user.id)])),
+            ('group_posts: страница',
+             Post.objects.for_feed().filter(group_id=group.id)[:page]),
+            ('profile: автор', User.objects.filter(username=user.username)),
+            ('profile: подписка', Follow.objects.filter(
+                user_id=user.id, author_id=user.id)),
+            ('profile: страница',
+             Post.objects.for_feed().filter(author_id=user.id)[:page]),
+            ('post_detail: пост', Post.objects.for_feed().filter(id=post_id)),
+            ('post_detail: комментарии',
+             Comment.objects.filter(post_id=post_id)),
+            ('follow_index: страница',
+             follow_feed(user).for_feed()[:page]),
+            ('fan-out: подписчики автора', Follow.objects.filter(
+                author_id=user.id).values_list('user_id', flat=True)),
+        )
+
+    def handle(self, *args, **options):
+        scans = 0
+        for name, queryset in self.queries(*self.sample(options)):
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for line in plan.splitlines():
+                if FULL_SCAN.search(line):
+                    scans += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'  {line}  <- полный просмотр'))
+                elif TEMP_SORT.search(line):
+                    self.stdout.write(self.style.WARNING(
+                        f'  {line}  <- сортировка без индекса'))
+                else:
+                    self.stdout.write(f'  {line}')
+        if scans and options['fail_on_scan']:
+            raise CommandError(f'Полных просмотров таблиц: {scans}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Полных просмотров таблиц: {scans}'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = ('Выгрузить посты (и комментарии) автора или группы в NDJSON '
+            'или JSON потоком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', help='Имя пользователя-автора.')
+        parser.add_argument('--group', help='Slug группы.')
+        parser.add_argument('--format', default='ndjson',
+                            choices=export.FORMATS)
+        parser.add_argument('--comments', action='store_true',
+                            help='Добавить комментарии к постам.')
+        parser.add_argument('--output', help='Файл; по умолчанию stdout.')
+
+    def handle(self, *args, **options):
+        author = group = None
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет автора {options["author"]}')
+        if options['group']:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}')
+        chunks = export.serialize(
+            export.records(author, group, options['comments']),
+            options['format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            file.writelines(chunks)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгрузка записана в {options["output"]}'))
@@ -0,0 +1,119 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import bulk, counters, feed
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'город лето утро дорога книга музыка кофе дождь море поезд друг '
+    'работа вечер свет окно снег парк кино вопрос ответ идея проект '
+    'сегодня завтра вчера снова очень просто немного сначала потом'
+).split()
+PASSWORD = 'load-test'
+
+
+class Command(BaseCommand):
+    help = ('Сгенерировать синтетические данные для нагрузочных тестов: '
+            'пользователей, группы, посты, комментарии и подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросать даты.')
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс имён пользователей и групп.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--skip-feed', action='store_true',
+                            help='Не пересобирать ленты подписок: backfill '
+                                 'по всей истории постов долгий.')
+
+    @staticmethod
+    def popular(ids):
+        """
+        Выбор id с распределением Ципфа: первые в списке встречаются
+        намного чаще, как популярные авторы и группы.
+        """
+        weights = list(accumulate(1 / rank for rank in range(1, len(ids) + 1)))
+
+        def choose():
+            return random.choices(ids, cum_weights=weights)[0]
+        return choose
+
+    def text(self, low, high):
+        return ' '.join(random.choices(WORDS, k=random.randint(low, high)))
+
+    def moment(self):
+        return self.now - timedelta(seconds=random.randint(0, self.span))
+
+    def report(self, name, total):
+        self.stdout.write(f'{name}: {total}')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.now = timezone.now()
+        self.span = options['days'] * 86400
+        prefix, size = options['prefix'], options['batch_size']
+        start = User.objects.filter(username__startswith=prefix).count()
+
+        password = make_password(PASSWORD)
+        self.report('Пользователи', bulk.insert(User, (
+            User(username=f'{prefix}{number}', password=password,
+                 first_name=random.choice(WORDS).capitalize())
+            for number in range(start, start + options['users'])
+        ), size))
+        self.report('Группы', bulk.insert(Group, (
+            Group(title=f'Группа {prefix} {number}',
+                  slug=f'{prefix}-{number}-{self.now:%Y%m%d%H%M%S}',
+                  description=self.text(5, 20))
+            for number in range(options['groups'])
+        ), size))
+
+        user_ids = list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('id', flat=True))
+        random.shuffle(user_ids)
+        author = self.popular(user_ids)
+        group = self.popular(group_ids) if group_ids else lambda: None
+
+        self.report('Посты', bulk.insert(Post, (
+            Post(author_id=author(), text=self.text(5, 80),
+                 group_id=group() if random.random() < 0.7 else None,
+                 pub_date=self.moment())
+            for _ in range(options['posts'])
+        ), size, as_is=True))
+        post_ids = list(Post.objects.filter(
+            author_id__in=user_ids).values_list('id', flat=True))
+        post = self.popular(post_ids)
+        self.report('Комментарии', bulk.insert(Comment, (
+            Comment(post_id=post(), author_id=random.choice(user_ids),
+                    text=self.text(2, 30), created=self.moment())
+            for _ in range(options['comments'] if post_ids else 0)
+        ), size, as_is=True))
+
+        # Повторные пары отбрасываются ignore_conflicts: считаем по базе.
+        follows = Follow.objects.count()
+        bulk.insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in (
+                (random.choice(user_ids), author())
+                for _ in range(options['follows']))
+            if user_id != author_id
+        ), size, ignore_conflicts=True)
+        self.report('Подписки', Follow.objects.count() - follows)
+
+        self.report('Счётчики', counters.recount())
+        if not options['skip_feed']:
+            self.report('Ленты (подписок)', feed.backfill())
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, пароль пользователей: {PASSWORD}'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Построить миниатюры для постов с картинкой без миниатюры.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перестроить миниатюры всех постов.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(thumbnail='')
+        done = failed = 0
+        for post_id, name in posts.values_list('id', 'image').iterator():
+            try:
+                thumbnails.generate(post_id, name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Пост {post_id}: {error}')
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр построено: {done}, ошибок: {failed}'))
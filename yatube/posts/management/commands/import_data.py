@@ -0,0 +1,70 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import ORDER, Importer
+
+
+class Command(BaseCommand):
+    help = ('Импортировать пользователей, группы, посты, комментарии и '
+            'подписки из NDJSON (записи с полем type, как у export_posts) '
+            'или CSV (один тип на файл, --type).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+',
+                            help='Файлы .ndjson/.jsonl/.csv или - (stdin).')
+        parser.add_argument('--format', choices=('auto', 'ndjson', 'csv'),
+                            default='auto')
+        parser.add_argument('--type', choices=ORDER, dest='kind',
+                            help='Тип записей CSV-файла.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-feed', action='store_true',
+                            help='Не пересобирать ленты подписок.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересчитать счётчики, поиск и ленты '
+                                 'целиком, а не только затронутые.')
+
+    def records(self, path, options):
+        file_format = options['format']
+        if file_format == 'auto':
+            file_format = 'csv' if path.endswith('.csv') else 'ndjson'
+        if file_format == 'csv' and not options['kind']:
+            raise CommandError('Для CSV нужен --type.')
+        file = (sys.stdin if path == '-'
+                else open(path, encoding='utf-8', newline=''))
+        with file:
+            if file_format == 'csv':
+                for row in csv.DictReader(file):
+                    yield {'type': options['kind'], **row}
+                return
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as error:
+                    raise CommandError(f'{path}:{number}: {error}')
+                if options['kind']:
+                    record.setdefault('type', options['kind'])
+                yield record
+
+    def handle(self, *args, files, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должно быть больше нуля.')
+        log = (self.stderr.write if options['verbosity'] > 1
+               else lambda message: None)
+        importer = Importer(options['batch_size'], log)
+        for path in files:
+            for record in self.records(path, options):
+                importer.add(record)
+        elapsed = importer.finish(rebuild_feed=not options['skip_feed'],
+                                  rebuild=options['rebuild'])
+        total = sum(importer.created.values())
+        for kind in ORDER:
+            self.stdout.write(f'{kind}: {importer.created[kind]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано строк: {total} за {elapsed:.1f} с '
+            f'({total / elapsed if elapsed else 0:.0f} строк/с), '
+            f'пропущено записей: {importer.errors}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать полнотекстовый индекс постов и комментариев.'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('Индекс FTS5 есть только на SQLite.')
+        total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов в индексе: {total}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать денормализованные счётчики по базе.'
+
+    def handle(self, *args, **options):
+        total = counters.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчиков пересчитано: {total}'))
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Счётчик')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_celebrities(apps, schema_editor):
+    """Раньше множество жило только в кэше: взять текущих по порогу."""
+    threshold = getattr(settings, 'FEED_CELEBRITY_FOLLOWERS', None)
+    if not threshold:
+        return
+    Follow = apps.get_model('posts', 'Follow')
+    Celebrity = apps.get_model('posts', 'Celebrity')
+    authors = (Follow.objects.values('author')
+               .annotate(followers=models.Count('id'))
+               .filter(followers__gte=threshold)
+               .values_list('author', flat=True))
+    Celebrity.objects.bulk_create(
+        [Celebrity(author_id=author_id) for author_id in authors])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0025_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Celebrity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Без fan-out с')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_celebrity'),
+    ]
+
+    operations = [
+        # Существующие подписки уже в лентах, новые — ещё нет.
+        migrations.AddField(
+            model_name='follow',
+            name='feed_pending',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Посты ещё не в ленте'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='feed_pending',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Посты ещё не в ленте'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='feed_pending',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ещё не разложен по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(condition=models.Q(feed_pending=True), fields=['user'], name='follow_feed_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(feed_pending=True), fields=['author'], name='post_feed_pending_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -22,6 +23,35 @@ class Group(models.Model):
         return self.title
 
 
+class FeedIterable(models.query.ModelIterable):
+    """
+    Посты, которым группы подставлены из реестра posts.groups, а авторы —
+    из сводок posts.authors (одно чтение кэша на выборку).
+    """
+
+    def __iter__(self):
+        from . import authors, groups
+
+        return iter(authors.attach(groups.attach(super().__iter__())))
+
+
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводит карточка поста (includes/post.html и ленты).
+    FEED_FIELDS = (
+        'id', 'text', 'pub_date', 'image', 'thumbnail', 'comments_count',
+        'author_id', 'group_id',
+    )
+
+    def for_feed(self):
+        """
+        Посты только с нужными полями; группы и авторы берутся из реестра
+        групп и сводок авторов без запросов к их таблицам.
+        """
+        queryset = self.only(*self.FEED_FIELDS)
+        queryset._iterable_class = FeedIterable
+        return queryset
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -52,9 +82,36 @@ class Post(models.Model):
         blank=True,
         null=True
     )
+    thumbnail = models.CharField(
+        verbose_name='Миниатюра карточки',
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Комментариев',
+        default=0,
+        editable=False
+    )
+    feed_pending = models.BooleanField(
+        verbose_name='Ещё не разложен по лентам',
+        default=False,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author'], condition=Q(feed_pending=True),
+                         name='post_feed_pending_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -77,6 +134,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -91,6 +152,9 @@ class Follow(models.Model):
                                on_delete=models.CASCADE,
                                related_name='following',
                                verbose_name='на Автора')
+    feed_pending = models.BooleanField(default=True,
+                                       editable=False,
+                                       verbose_name='Посты ещё не в ленте')
 
     class Meta:
         constraints = [
@@ -99,3 +163,62 @@ class Follow(models.Model):
                 name='unigue subs'
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+            models.Index(fields=['user'], condition=Q(feed_pending=True),
+                         name='follow_feed_pending_idx'),
+        ]
+
+
+class FeedItem(models.Model):
+    """Запись ленты подписок, материализованная при публикации поста."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='feed_items',
+                             verbose_name='Читатель')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='feed_items',
+                             verbose_name='Пост')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed item'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+
+class Celebrity(models.Model):
+    """Автор, посты которого не раскладываются по лентам подписчиков."""
+    author = models.OneToOneField(User,
+                                  on_delete=models.CASCADE,
+                                  related_name='+',
+                                  verbose_name='Автор')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Без fan-out с')
+
+    def __str__(self):
+        return str(self.author_id)
+
+
+class Counter(models.Model):
+    """Денормализованный счётчик, например posts:author:<id>."""
+    name = models.CharField(max_length=100,
+                            unique=True,
+                            verbose_name='Счётчик')
+    value = models.BigIntegerField(default=0,
+                                   verbose_name='Значение')
+
+    def __str__(self):
+        return f'{self.name}={self.value}'
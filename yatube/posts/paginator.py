@@ -0,0 +1,178 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+PAGE_PARAM = 'page'
+NEXT = 'n'
+PREVIOUS = 'p'
+# Ссылок на страницы по обе стороны от текущей.
+PAGE_WINDOW = 4
+
+
+class CursorPage:
+    """Страница keyset-пагинации: стоимость не зависит от её номера."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page of %s items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Пагинация по ключу (ordering[0], ordering[1]) без COUNT(*) и OFFSET.
+
+    Первое поле задаёт порядок ленты, второе (обычно id) делает его
+    строгим. Курсор указывает на крайнюю запись текущей страницы.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    def encode_cursor(self, direction, obj):
+        values = [direction]
+        for name in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat()
+                          if hasattr(value, 'isoformat') else str(value))
+        raw = '|'.join(values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Вернуть (направление, значения ключа) или None."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        direction, *values = raw.split('|')
+        if direction not in (NEXT, PREVIOUS) or len(values) != 2:
+            return None
+        model = self.object_list.model
+        try:
+            values = [model._meta.get_field(name).to_python(value)
+                      for name, value in zip(self.fields, values)]
+        except (ValidationError, ValueError):
+            return None
+        if None in values:
+            return None
+        return direction, values
+
+    def _beyond(self, values, backwards):
+        """Условие «строго после курсора» в порядке ленты."""
+        lookups = []
+        for name, desc in zip(self.fields, self.descending):
+            lookups.append(f'{name}__{"lt" if desc != backwards else "gt"}')
+        first, second = self.fields[0], lookups[1]
+        return (Q(**{lookups[0]: values[0]})
+                | Q(**{first: values[0], second: values[1]}))
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else '-' + name
+                for name in self.ordering]
+
+    def get_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if decoded is None:
+            rows = list(queryset.order_by(*self.ordering)
+                        [:self.per_page + 1])
+            has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+            return self._page(rows, has_next=has_more, has_previous=False)
+        direction, values = decoded
+        backwards = direction == PREVIOUS
+        queryset = queryset.filter(self._beyond(values, backwards))
+        if backwards:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        rows = list(queryset[:self.per_page + 1])
+        has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            return self._page(rows, has_next=True, has_previous=has_more)
+        return self._page(rows, has_next=has_more, has_previous=True)
+
+    def _page(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(NEXT, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class CountedPaginator(Paginator):
+    """Paginator с заранее известным (денормализованным) числом записей."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.__dict__['count'] = count
+
+    def window(self, number, size=None):
+        """Номера страниц вокруг number: page_range бывает огромным."""
+        size = PAGE_WINDOW if size is None else size
+        return range(max(1, number - size),
+                     min(self.num_pages, number + size) + 1)
+
+
+def use_cursor(request):
+    return (settings.PAGINATION_MODE == 'cursor'
+            or CURSOR_PARAM in request.GET)
+
+
+def paginate(request, queryset, per_page=None, count=None):
+    """
+    Страница ленты: offset-пагинация или курсорная (настройка/параметр).
+
+    count — число записей (или функция, возвращающая его) из счётчика,
+    чтобы не выполнять COUNT(*); курсорной пагинации оно не нужно.
+    """
+    per_page = per_page or settings.PAGE_COUNT
+    if use_cursor(request):
+        paginator = CursorPaginator(queryset, per_page)
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+    if callable(count):
+        count = count()
+    paginator = CountedPaginator(queryset, per_page, count=count)
+    page = paginator.get_page(request.GET.get(PAGE_PARAM))
+    page.page_window = paginator.window(page.number)
+    return page
@@ -0,0 +1,157 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+На SQLite индекс — виртуальная таблица FTS5 posts_search (rowid = id
+поста, колонки text и comments), её синхронизируют сигналы Post и Comment.
+На других базах поиск откатывается к icontains без ранжирования.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+TABLE = 'posts_search'
+# Маркеры подсветки: экранируются вместе с текстом, потом меняются на <mark>.
+START, END = '\x02', '\x03'
+SNIPPET_TOKENS = 24
+# Совпадение в тексте поста весит больше, чем в комментариях.
+WEIGHTS = (2.0, 1.0)
+WORD = re.compile(r'\w+')
+
+_INDEX = (f'INSERT INTO {TABLE}(rowid, text, comments) '
+          'SELECT p.id, p.text, COALESCE((SELECT group_concat(c.text, %s) '
+          'FROM posts_comment c WHERE c.post_id = p.id), %s) '
+          'FROM posts_post p')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post_id):
+    """Переиндексировать пост вместе с его комментариями."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(_INDEX + ' WHERE p.id = %s', ['\n', '', post_id])
+
+
+def index_since(post_id):
+    """Переиндексировать посты с id не меньше post_id (после импорта)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid >= %s', [post_id])
+        cursor.execute(_INDEX + ' WHERE p.id >= %s', ['\n', '', post_id])
+
+
+def remove_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Пересобрать индекс целиком. Возвращает число постов в нём."""
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(_INDEX, ['\n', ''])
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def match_expression(query, column=None):
+    """
+    Запрос пользователя в выражение MATCH: слова в кавычках с поиском
+    по префиксу, все обязательны. Синтаксис FTS5 из ввода не проходит.
+    """
+    expression = ' '.join(f'"{word}"*' for word in WORD.findall(query))
+    if expression and column:
+        expression = f'{column} : ({expression})'
+    return expression
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, в тексте которых есть все слова query."""
+    if not available():
+        for word in WORD.findall(query):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    expression = match_expression(query, 'text')
+    if not expression:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression]))
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(START, '<mark>')
+                     .replace(END, '</mark>'))
+
+
+class SearchResults:
+    """
+    Найденные посты по рангу, лениво для Paginator: count() и срез
+    выполняют по одному запросу к индексу, посты загружаются только
+    для среза.
+    """
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+        self.query = query
+
+    def count(self):
+        if not self.expression:
+            return 0
+        if not available():
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {TABLE} '
+                           f'WHERE {TABLE} MATCH %s', [self.expression])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.expression:
+            return []
+        if not available():
+            return list(self._fallback().for_feed()[index])
+        offset = index.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({TABLE}, -1, %s, %s, %s, %s) '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY bm25({TABLE}, %s, %s) LIMIT %s OFFSET %s',
+                [START, END, '…', SNIPPET_TOKENS, self.expression,
+                 *WEIGHTS, index.stop - offset, offset])
+            rows = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk(
+            [post_id for post_id, _ in rows])
+        found = []
+        for post_id, snippet in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.snippet = highlight(snippet)
+                found.append(post)
+        return found
+
+    def _fallback(self):
+        condition = Q()
+        for word in WORD.findall(self.query):
+            condition &= (Q(text__icontains=word)
+                          | Q(comments__text__icontains=word))
+        return Post.objects.filter(condition).distinct()
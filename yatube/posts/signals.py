@@ -0,0 +1,113 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (authors, counters, feed, follows, groups, search,
+               thumbnails, versions)
+from .models import Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые выводят карточки постов.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = Post.objects.filter(pk=instance.pk).values(
+            'author_id', 'group_id', 'image').first()
+    previous_image = (instance._previous or {}).get('image') or ''
+    instance._image_changed = instance.image.name != previous_image
+    if instance._image_changed and not raw:
+        instance.thumbnail = ''
+    if instance._state.adding and not raw:
+        # Пока задача fan-out не выполнена, лента берёт пост при чтении.
+        instance.feed_pending = True
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    versions.bump(f'post:{instance.pk}',
+                  *versions.feed_scopes(instance.author_id, instance.group_id))
+    search.index_post(instance.pk)
+    if instance.image and getattr(instance, '_image_changed', False):
+        thumbnails.schedule(instance)
+    if created:
+        counters.post_created(instance)
+        authors.invalidate(instance.author_id)
+        feed.schedule_fan_out(instance.pk)
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        scope = (previous['author_id'], previous['group_id'])
+        if scope != (instance.author_id, instance.group_id):
+            counters.post_moved(scope, instance)
+            authors.invalidate(previous['author_id'], instance.author_id)
+            versions.bump(*versions.feed_scopes(*scope))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    versions.bump(f'post:{instance.pk}',
+                  *versions.feed_scopes(instance.author_id, instance.group_id))
+    counters.post_deleted(instance)
+    authors.invalidate(instance.author_id)
+    search.remove_post(instance.pk)
+
+
+def comment_bump(comment):
+    """Число комментариев выводится в карточке: обновить её и ленты."""
+    post = Post.objects.filter(pk=comment.post_id).values(
+        'author_id', 'group_id').first()
+    scopes = versions.feed_scopes(**post) if post else []
+    versions.bump(f'post:{comment.post_id}', *scopes)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.comments_changed(instance.post_id)
+        comment_bump(instance)
+    search.index_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comments_changed(instance.post_id, -1)
+    comment_bump(instance)
+    search.index_post(instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    versions.bump(f'group:{instance.pk}', versions.SITE, groups.SCOPE)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or CARD_USER_FIELDS & set(update_fields):
+        # У нового пользователя ещё нет карточек на страницах.
+        scopes = [f'user:{instance.pk}'] + ([] if created else [versions.SITE])
+        versions.bump(*scopes)
+        # Имя могло принадлежать удалённому пользователю с другим id.
+        authors.invalidate(instance.pk, usernames=[instance.username])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    authors.invalidate(instance.pk, usernames=[instance.username])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follows.follow_created(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.follow_removed(instance.user_id, instance.author_id)
@@ -0,0 +1,65 @@
+"""
+Фоновые задачи постов (core.tasks): ленты подписок, миниатюры и письма
+авторам.
+
+Письма уходят только авторам с адресом и не о собственных действиях.
+Задача читает данные заново: комментарий могли удалить, от автора могли
+отписаться, пока задача ждала.
+"""
+from django.core.mail import send_mail
+
+from core.tasks import task
+
+from . import feed, thumbnails
+from .models import Comment, Follow
+
+NOTIFY_COMMENT = 'posts.notify_comment'
+NOTIFY_FOLLOWER = 'posts.notify_follower'
+
+
+@task(feed.FAN_OUT)
+def fan_out_post(post_id):
+    feed.fan_out_post(post_id)
+
+
+@task(feed.ADD_AUTHOR)
+def add_author_to_feed(user_id, author_id):
+    feed.add_author_to_feed(user_id, author_id)
+
+
+@task(feed.REMOVE_AUTHOR)
+def remove_author_from_feed(user_id, author_id):
+    feed.remove_author_from_feed(user_id, author_id)
+
+
+@task(thumbnails.TASK)
+def build_thumbnails(post_id, name):
+    thumbnails.generate(post_id, name)
+
+
+@task(NOTIFY_COMMENT)
+def notify_comment(comment_id):
+    comment = Comment.objects.select_related(
+        'author', 'post__author').filter(id=comment_id).first()
+    if comment is None or comment.author_id == comment.post.author_id:
+        return
+    recipient = comment.post.author
+    if not recipient.email:
+        return
+    send_mail(
+        f'Новый комментарий к посту #{comment.post_id}',
+        f'{comment.author.get_full_name() or comment.author.username} '
+        f'прокомментировал ваш пост:\n\n{comment.text}',
+        None, [recipient.email])
+
+
+@task(NOTIFY_FOLLOWER)
+def notify_follower(user_id, author_id):
+    follow = Follow.objects.select_related('user', 'author').filter(
+        user_id=user_id, author_id=author_id).first()
+    if follow is None or not follow.author.email:
+        return
+    send_mail(
+        'Новый подписчик',
+        f'На вас подписался {follow.user.username}.',
+        None, [follow.author.email])
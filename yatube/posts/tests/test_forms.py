@@ -1,12 +1,18 @@
 import tempfile
 import shutil
+from io import BytesIO, StringIO
+
+from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from core.models import Task
 from posts.models import Group, Post, Comment
 
 User = get_user_model()
@@ -72,6 +78,69 @@ class TestCreateForm(TestCase):
             image=f"posts/{form_data['image'].name}",
             author=self.user).exists())
 
+    def test_form_image_thumbnail(self):
+        """Миниатюра строится для картинки и сбрасывается при её замене."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('thumb.gif', small_gif, 'image/gif'),
+        })
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual(post.thumbnail, '')
+        self.assertTrue(Task.objects.filter(
+            name='posts.thumbnails', args=f'[{post.id}, "{post.image.name}"]',
+        ).exists())
+        call_command('run_tasks', once=True, processes=0, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, post.thumbnail)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}), data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile('new.gif', small_gif,
+                                            'image/gif'),
+            })
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+
+    def test_thumbnail_changes_feed_etag(self):
+        """Готовая миниатюра меняет ETag ленты: карточка стала другой."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'group': self.group.id,
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('etag.gif', small_gif, 'image/gif'),
+        })
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:posts_group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        responses = {url: self.authorized_client.get(url) for url in urls}
+        call_command('run_tasks', once=True, processes=0, stdout=StringIO())
+        thumbnail = Post.objects.get(text='Пост с картинкой').thumbnail
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                revalidated = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(revalidated.status_code, 200)
+                self.assertContains(revalidated, thumbnail)
+
     def test_form_update(self):
         """
         Проверка редактирования поста через форму.
@@ -97,3 +166,88 @@ class TestCreateForm(TestCase):
             data=form_data, follow=True)
         self.assertTrue(Comment.objects.filter(
             text=form_data['text'], ).exists())
+
+    def test_comment_notification(self):
+        """Письмо автору о комментарии уходит из очереди задач."""
+        self.user.email = 'auth@example.com'
+        self.user.save()
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Интересно'})
+        self.assertEqual(mail.outbox, [])
+        call_command('run_tasks', once=True, processes=0, stdout=StringIO())
+        self.assertEqual(mail.outbox[0].to, ['auth@example.com'])
+        self.assertIn('Интересно', mail.outbox[0].body)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestImageUpload(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = self.client
+        self.authorized_client.force_login(self.user)
+
+    @staticmethod
+    def image_file(name, image_format, size=(20, 10), **options):
+        content = BytesIO()
+        Image.new('RGB', size, (255, 0, 0)).save(content, image_format,
+                                                 **options)
+        return SimpleUploadedFile(name, content.getvalue())
+
+    def create(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image})
+
+    def test_rejects_huge_dimensions_from_header(self):
+        """Картинка с огромными размерами отклоняется по заголовку."""
+        with self.settings(IMAGE_MAX_DIMENSION=15):
+            response = self.create(self.image_file('big.png', 'PNG'))
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка больше 15 точек по стороне')
+        self.assertFalse(Post.objects.exists())
+
+    def test_rejects_oversized_file(self):
+        """Файл больше IMAGE_UPLOAD_MAX_SIZE отклоняется."""
+        with self.settings(IMAGE_UPLOAD_MAX_SIZE=2 ** 20):
+            image = self.image_file('big.png', 'PNG')
+            response = self.create(SimpleUploadedFile(
+                'big.png', image.read() + b'0' * 2 ** 21))
+        self.assertFormError(response, 'form', 'image', 'Файл больше 1 МБ')
+
+    def test_rejects_not_an_image(self):
+        """Не-картинка отклоняется."""
+        response = self.create(SimpleUploadedFile('text.png', b'text'))
+        self.assertFormError(response, 'form', 'image',
+                             'Загрузите правильное изображение')
+
+    def test_strips_metadata(self):
+        """EXIF удаляется при перекодировании."""
+        exif = Image.Exif()
+        exif[0x010E] = 'секрет'
+        self.create(self.image_file('photo.jpg', 'JPEG',
+                                    exif=exif.tobytes()))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertNotIn('exif', image.info)
+
+    def test_converts_to_web_format(self):
+        """Формат не для браузера перекодируется в JPEG."""
+        self.create(self.image_file('picture.bmp', 'BMP'))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/picture.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
@@ -1,7 +1,16 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post, Comment
+from .. import authors, counters, follows, groups
+from ..models import Group, Post, Comment, Counter, Follow
 
 User = get_user_model()
 
@@ -61,3 +70,220 @@ class CommentModelTest(TestCase):
         comment = self.comment
         expected_object_name = comment.text[:15]
         self.assertEqual(expected_object_name, str(comment))
+
+
+class PostCounterTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def counts(self):
+        names = (
+            counters.POSTS,
+            counters.author_posts(self.user.id),
+            counters.group_posts(self.group.id),
+            counters.group_posts(self.other_group.id),
+        )
+        values = counters.get_many(names)
+        return [values[name] for name in names]
+
+    def test_counters_follow_posts(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        self.assertEqual(self.counts(), [0, 0, 0, 0])
+        post = Post.objects.create(author=self.user, text='Текст',
+                                   group=self.group)
+        self.assertEqual(self.counts(), [1, 1, 1, 0])
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.counts(), [1, 1, 0, 1])
+        post.delete()
+        self.assertEqual(self.counts(), [0, 0, 0, 0])
+
+    def test_recount_command(self):
+        """Команда recount исправляет расхождения."""
+        Post.objects.create(author=self.user, text='Текст', group=self.group)
+        self.assertEqual(self.counts(), [1, 1, 1, 0])
+        Counter.objects.update(value=42)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.counts(), [1, 1, 1, 0])
+
+
+class FeedIndexTest(TestCase):
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не просматривают таблицы целиком."""
+        out = StringIO()
+        call_command('explain_feeds', '--fail-on-scan', stdout=out)
+        self.assertIn('Полных просмотров таблиц: 0', out.getvalue())
+
+
+class GroupRegistryTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Post.objects.create(author=cls.user, group=cls.group, text='Текст')
+
+    def setUp(self):
+        # Откат транзакции теста не вызывает сигналы: версии сбрасываются.
+        cache.clear()
+
+    def test_pages_skip_group_table(self):
+        """Лента и страница группы не читают таблицу групп."""
+        groups.get(self.group.id)
+        for url in (reverse('posts:index'),
+                    reverse('posts:posts_group', args=[self.group.slug])):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, 'Группа')
+                self.assertFalse([query for query in queries
+                                  if '"posts_group"' in query['sql']])
+
+    def test_invalidated_on_change(self):
+        """Правка и удаление группы сразу видны в реестре."""
+        self.assertEqual(groups.get(self.group.id).title, 'Группа')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое имя'
+        group.save()
+        self.assertEqual(groups.get_by_slug('group').title, 'Новое имя')
+        Group.objects.filter(pk=self.group.pk).update(title='Мимо сигналов')
+        self.assertEqual(groups.get_by_slug('group').title, 'Новое имя')
+        groups.flush()
+        self.assertEqual(groups.get_by_slug('group').title, 'Мимо сигналов')
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertIsNone(groups.get(self.group.id))
+
+    def test_admin_flush_action(self):
+        """Действие админки сбрасывает реестр."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        groups.get(self.group.id)
+        Group.objects.filter(pk=self.group.pk).update(title='Мимо сигналов')
+        self.client.post(reverse('admin:posts_group_changelist'), {
+            'action': 'flush_registry',
+            '_selected_action': [self.group.pk],
+        })
+        self.assertEqual(groups.get(self.group.id).title, 'Мимо сигналов')
+
+
+class AuthorSummaryTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth', first_name='Лев',
+                                            last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=cls.user, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_summary(self):
+        """Сводка по id и по имени; повторное чтение без запросов."""
+        summary = authors.get_by_username('auth')
+        self.assertEqual(summary['full_name'], 'Лев Толстой')
+        self.assertEqual(summary['posts_count'], 1)
+        self.assertEqual(summary['followers_count'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(authors.get(self.user.id), summary)
+            self.assertEqual(authors.get_by_username('auth'), summary)
+        self.assertIsNone(authors.get_by_username('nobody'))
+
+    def test_invalidated_on_change(self):
+        """Посты, подписки и правка профиля обновляют сводку."""
+        authors.get(self.user.id)
+        Post.objects.create(author=self.user, text='Ещё текст')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        summary = authors.get(self.user.id)
+        self.assertEqual(summary['posts_count'], 2)
+        self.assertEqual(summary['followers_count'], 1)
+        follow.delete()
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertIsNone(authors.get_by_username('auth'))
+        summary = authors.get_by_username('renamed')
+        self.assertEqual(summary['followers_count'], 0)
+
+    def test_feed_skips_user_table(self):
+        """Лента берёт авторов из сводок, а не из таблицы пользователей."""
+        authors.get(self.user.id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Лев Толстой')
+        self.assertFalse([query for query in queries
+                          if '"auth_user"' in query['sql']])
+
+
+class FollowGraphTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.star, cls.other = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'star', 'other'))
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.star)
+        Follow.objects.create(user=cls.other, author=cls.star)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts(self):
+        """Числа подписчиков и подписок следуют за подписками."""
+        self.assertEqual(follows.counts(self.star.id),
+                         {'followers': 2, 'following': 0})
+        follow = Follow.objects.create(user=self.reader, author=self.star)
+        self.assertEqual(follows.counts(self.star.id)['followers'], 3)
+        self.assertEqual(follows.counts(self.reader.id)['following'], 2)
+        follow.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(follows.counts(self.star.id)['followers'], 2)
+
+    def test_follow_without_fake_signals(self):
+        """follow/unfollow не шлют сигналы модели с несохранённым Follow."""
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(kwargs['instance'])
+
+        post_save.connect(receiver, sender=Follow)
+        post_delete.connect(receiver, sender=Follow)
+        self.addCleanup(post_save.disconnect, receiver, sender=Follow)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Follow)
+        self.assertTrue(follows.follow(self.reader.id, self.star.id))
+        self.assertEqual(follows.counts(self.star.id)['followers'], 3)
+        self.assertTrue(follows.unfollow(self.reader.id, self.star.id))
+        self.assertEqual(follows.counts(self.star.id)['followers'], 2)
+        self.assertEqual(sent, [])
+
+    def test_followed(self):
+        """Подписки на пачку авторов — одним запросом."""
+        with self.assertNumQueries(1):
+            found = follows.followed(
+                self.reader, [self.friend.id, self.star.id, self.other.id])
+        self.assertEqual(found, {self.friend.id})
+
+    def test_suggestions(self):
+        """Рекомендуются авторы, на которых подписаны мои авторы."""
+        self.assertEqual(follows.suggestions(self.reader), [self.star.id])
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.assertNotIn(self.star.id, follows.suggestions(self.reader))
@@ -1,5 +1,8 @@
+import base64
+import json
 import tempfile
 import shutil
+from io import StringIO
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase, override_settings
@@ -7,9 +10,17 @@ from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post, Comment, Follow
+from core.models import Task
+
+from .. import counters, feed
+from ..checks import shared_cache
+from ..models import Group, Post, Comment, Counter, Follow, FeedItem
 from ..forms import PostForm
+from .utils import QueryBudgetMixin
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -194,14 +205,25 @@ class PostPagesTests(TestCase):
         self.assertEqual(response.content, response_after_follow.content)
 
     def test_cach_in_index_page(self):
-        """Проверка работы cach."""
+        """Карточка поста кэшируется до изменения поста."""
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.filter(id=self.post.id).update(text='Мимо сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
-        before_clearing_the_cache = response.content
-        cache.clear()
+        self.assertContains(response, self.post.text)
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Новый текст поста'
+        post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, post.text)
+        self.assertNotContains(response, self.post.text)
+
+    def test_card_cache_follows_author_name(self):
+        """Смена имени автора обновляет закэшированную карточку."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.user.first_name = 'Новое имя'
+        self.user.save()
         response = self.authorized_client.get(reverse('posts:index'))
-        after_clearing_the_cache = response.content
-        self.assertNotEqual(before_clearing_the_cache,
-                            after_clearing_the_cache)
+        self.assertContains(response, 'Новое имя')
 
 
 class PostPaginatorTests(TestCase):
@@ -252,3 +274,671 @@ class PostPaginatorTests(TestCase):
                 page_count_this = Post.objects.count() - settings.PAGE_COUNT
                 self.assertEqual(len(response.context['page_obj']),
                                  page_count_this)
+
+
+class PostCursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        post_ = (Post(text=f'Текст проверки {i}',
+                 group=cls.group,
+                 author=cls.user) for i in range(1, 14))
+        Post.objects.bulk_create(post_)
+
+    def setUp(self):
+        self.authorized_client = self.client
+        self.authorized_client.force_login(self.user)
+
+    def test_cursor_pages(self):
+        """Курсорная пагинация: вперёд и назад без пропусков."""
+        url_page_names = (
+            reverse('posts:index'),
+            reverse('posts:posts_group',
+                    kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for value in url_page_names:
+            with self.subTest(value=value):
+                response = self.authorized_client.get(value + '?cursor=')
+                first_page = response.context['page_obj']
+                self.assertEqual(len(first_page), settings.PAGE_COUNT)
+                self.assertFalse(first_page.has_previous())
+                response = self.authorized_client.get(
+                    value + '?cursor=' + first_page.next_cursor)
+                second_page = response.context['page_obj']
+                self.assertEqual(
+                    len(second_page),
+                    Post.objects.count() - settings.PAGE_COUNT)
+                self.assertFalse(second_page.has_next())
+                response = self.authorized_client.get(
+                    value + '?cursor=' + second_page.previous_cursor)
+                self.assertEqual(
+                    [post.id for post in response.context['page_obj']],
+                    [post.id for post in first_page])
+
+    def test_invalid_cursor_gives_first_page(self):
+        """Испорченный курсор — первая страница, а не ошибка."""
+        first = [post.id for post in Post.objects.order_by(
+            '-pub_date', '-id')[:settings.PAGE_COUNT]]
+        raw = ('x|2020-01-01T00:00:00|1', 'n|2020-13-45T00:00:00|1',
+               'n|вчера|1', 'n|2020-01-01T00:00:00|один',
+               'n|2020-01-01T00:00:00')
+        cursors = ['!!!'] + [
+            base64.urlsafe_b64encode(value.encode()).decode()
+            for value in raw]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.authorized_client.get(
+                    reverse('posts:index'), {'cursor': cursor})
+                self.assertEqual(
+                    [post.id for post in response.context['page_obj']],
+                    first)
+
+    def test_cursor_pagination_mode_setting(self):
+        """Настройка PAGINATION_MODE включает курсоры для ленты."""
+        with self.settings(PAGINATION_MODE='cursor'):
+            response = self.authorized_client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertContains(response, '?cursor=' + page_obj.next_cursor)
+
+
+class FollowFeedTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = self.client
+        self.authorized_client.force_login(self.user)
+
+    def follow_page(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def run_tasks(self):
+        call_command('run_tasks', once=True, processes=0, stdout=StringIO())
+
+    def test_fan_out_on_post_and_follow(self):
+        """Пост раскладывается в ленту, подписка переносит старые посты."""
+        Post.objects.create(author=self.author, text='Старый пост')
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.follow_page(), ['Новый пост', 'Старый пост'])
+        self.run_tasks()
+        self.assertEqual(FeedItem.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(Post.objects.filter(feed_pending=True).exists())
+        self.assertFalse(Follow.objects.filter(feed_pending=True).exists())
+        self.assertEqual(self.follow_page(), ['Новый пост', 'Старый пост'])
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.follow_page(), [])
+        self.run_tasks()
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+
+    def test_post_create_only_enqueues_fan_out(self):
+        """Публикация ставит задачу fan-out и не пишет записи ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.run_tasks()
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(Task.objects.filter(
+            name=feed.FAN_OUT, key=f'{feed.FAN_OUT}:{post.pk}',
+            status=Task.PENDING).exists())
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(self.follow_page(), ['Новый пост'])
+
+    def test_refollow_before_tasks(self):
+        """Отписка и повторная подписка до задач не теряют посты."""
+        Post.objects.create(author=self.author, text='Пост автора')
+        for name in ('profile_follow', 'profile_unfollow', 'profile_follow'):
+            self.authorized_client.get(reverse(
+                f'posts:{name}', kwargs={'username': self.author}))
+        self.run_tasks()
+        self.assertEqual(FeedItem.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.follow_page(), ['Пост автора'])
+
+    def test_celebrity_posts_pulled_on_read(self):
+        """Посты «знаменитостей» не раскладываются, но видны в ленте."""
+        with self.settings(FEED_CELEBRITY_FOLLOWERS=1):
+            Follow.objects.create(user=self.user, author=self.author)
+            Post.objects.create(author=self.author, text='Пост звезды')
+            self.run_tasks()
+            self.assertFalse(FeedItem.objects.exists())
+            self.assertEqual(self.follow_page(), ['Пост звезды'])
+
+    def test_celebrity_kept_after_cache_loss(self):
+        """Отметка «знаменитости» переживает сброс кэша и порог."""
+        with self.settings(FEED_CELEBRITY_FOLLOWERS=1):
+            Follow.objects.create(user=self.user, author=self.author)
+            Post.objects.create(author=self.author, text='Пост звезды')
+            self.run_tasks()
+        cache.clear()
+        with self.settings(FEED_CELEBRITY_FOLLOWERS=2):
+            self.assertEqual(self.follow_page(), ['Пост звезды'])
+            Post.objects.create(author=self.author, text='Ещё пост')
+            self.run_tasks()
+            self.assertFalse(FeedItem.objects.exists())
+
+    def test_backfill_feed_command(self):
+        """Команда backfill_feed восстанавливает ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Пост автора')
+        self.run_tasks()
+        FeedItem.objects.all().delete()
+        self.assertEqual(self.follow_page(), [])
+        call_command('backfill_feed', stdout=StringIO())
+        self.assertEqual(self.follow_page(), ['Пост автора'])
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(settings.PAGE_COUNT + 2):
+            author = User.objects.create_user(username=f'author{i}',
+                                              first_name=f'Автор {i}')
+            Follow.objects.create(user=cls.user, author=author)
+            cls.post = Post.objects.create(author=author, group=cls.group,
+                                           text=f'Текст проверки {i}')
+        for author in User.objects.all():
+            Comment.objects.create(post=cls.post, author=author,
+                                   text=f'Комментарий {author.username}')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = self.client
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_query_budget(self):
+        """Число запросов ленты не зависит от числа карточек."""
+        # Пост: +1 запрос id автора для ETag; авторы — из сводок.
+        # Лента и группа: +1 запрос отметок подписок читателя.
+        budgets = {
+            reverse('posts:index'): 5,
+            reverse('posts:posts_group',
+                    kwargs={'slug': self.group.slug}): 5,
+            reverse('posts:profile',
+                    kwargs={'username': self.post.author}): 4,
+            reverse('posts:follow_index'): 4,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.id}): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.authorized_client.get(url)
+                self.assertQueryBudget(self.authorized_client, url, budget)
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text='Текст поста')
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:posts_group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.client).get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без запроса постов."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(1 if url == self.urls[3] else 0):
+                    revalidated = self.revalidate(url, response)
+                self.assertEqual(revalidated.status_code, 304)
+
+    def test_changes_invalidate(self):
+        """Новый комментарий, пост или переименование меняют ETag."""
+        changes = (
+            lambda: Comment.objects.create(post=self.post, author=self.user,
+                                           text='Комментарий'),
+            lambda: Post.objects.create(author=self.user, group=self.group,
+                                        text='Ещё пост'),
+            lambda: User.objects.filter(pk=self.user.pk).first().save(),
+        )
+        for change in changes:
+            responses = {url: self.client.get(url) for url in self.urls}
+            change()
+            for url, response in responses.items():
+                with self.subTest(url=url):
+                    self.assertEqual(
+                        self.revalidate(url, response).status_code, 200)
+
+    @override_settings(CONDITIONAL_GET=False)
+    def test_disabled(self):
+        """Без CONDITIONAL_GET валидаторов нет, страница всегда свежая."""
+        response = self.client.get(self.urls[0])
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_shared_cache_check(self):
+        """Версии в LocMemCache при нескольких процессах — предупреждение."""
+        with self.settings(DEBUG=False, CONDITIONAL_GET=True):
+            self.assertEqual([warning.id for warning in shared_cache(None)],
+                             ['posts.W001'])
+            with self.settings(CACHES={'default': {
+                    'BACKEND': 'core.sqlite_cache.SQLiteCache',
+                    'LOCATION': '/tmp/yatube-check.sqlite3'}}):
+                self.assertEqual(shared_cache(None), [])
+
+    def test_user_specific(self):
+        """ETag одной страницы различается для разных пользователей."""
+        url = self.urls[0]
+        response = self.client.get(url)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        Follow.objects.create(user=self.reader, author=self.user)
+        profile = self.urls[2]
+        response = self.client.get(profile)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.revalidate(profile, response).status_code, 200)
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE=True)
+class AnonymousPageCacheTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text='Текст поста')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_cached(self):
+        """Повторный запрос анонима отдаётся из кэша без запросов постов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:posts_group', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.client.get(url).content
+                with self.assertNumQueries(1 if url == urls[3] else 0):
+                    response = self.client.get(url)
+                self.assertEqual(response.content, content)
+
+    def test_purged_by_events(self):
+        """Новый пост, правка, комментарий и правка группы видны сразу."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        group = reverse('posts:posts_group', kwargs={'slug': self.group.slug})
+        self.client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'Новый пост')
+        self.client.get(detail)
+        self.post.text = 'Правка поста'
+        self.post.save()
+        self.assertContains(self.client.get(detail), 'Правка поста')
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        self.assertContains(self.client.get(detail), 'Комментарий')
+        self.client.get(group)
+        self.group.title = 'Новое имя'
+        self.group.save()
+        self.assertContains(self.client.get(group), 'Новое имя')
+
+    def test_authenticated_not_cached(self):
+        """Вошедший пользователь получает страницу, собранную заново."""
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+
+
+class CommentsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Текст')
+        for i in range(settings.COMMENTS_PER_PAGE + 3):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Комментарий {i}')
+
+    def test_comments_count(self):
+        """comments_count следует за комментариями и выводится в карточке."""
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count,
+                         settings.COMMENTS_PER_PAGE + 3)
+        Comment.objects.filter(post=self.post).first().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count,
+                         settings.COMMENTS_PER_PAGE + 2)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response,
+                            f'Комментариев: {self.post.comments_count}')
+        Post.objects.update(comments_count=0)
+        call_command('recount', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count,
+                         settings.COMMENTS_PER_PAGE + 2)
+
+    def test_comments_pages(self):
+        """Комментарии выводятся страницами по курсору."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        first = self.client.get(url).context['comments']
+        self.assertEqual(len(first), settings.COMMENTS_PER_PAGE)
+        self.assertEqual(first[0].text,
+                         f'Комментарий {settings.COMMENTS_PER_PAGE + 2}')
+        second = self.client.get(
+            url, {'comments': first.next_cursor}).context['comments']
+        self.assertEqual([comment.text for comment in second],
+                         ['Комментарий 2', 'Комментарий 1', 'Комментарий 0'])
+        self.assertFalse(second.has_next())
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text='Текст поста')
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(post=cls.post, author=cls.other,
+                               text='Комментарий')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('posts:export'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_by_author(self):
+        """NDJSON: посты автора и комментарии к ним."""
+        lines = self.export(author='auth', comments='1').splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['type'] for record in records],
+                         ['post', 'comment'])
+        self.assertEqual(records[0]['group'], 'test-slug')
+        self.assertEqual(records[1]['post'], self.post.id)
+
+    def test_json_by_group(self):
+        """JSON-массив постов группы и пустая выгрузка."""
+        records = json.loads(self.export(group='test-slug', format='json'))
+        self.assertEqual([record['text'] for record in records],
+                         ['Текст поста'])
+        Post.objects.filter(group=self.group).delete()
+        self.assertEqual(
+            json.loads(self.export(group='test-slug', format='json')), [])
+
+    def test_unfiltered_only_for_staff(self):
+        """Без автора и группы выгрузка доступна только персоналу."""
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 400)
+        self.user.is_staff = True
+        self.user.save()
+        lines = self.export().splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_command(self):
+        """Команда выгружает то же, что и страница."""
+        out = StringIO()
+        call_command('export_posts', author='other', stdout=out)
+        self.assertEqual(out.getvalue(), self.export(author='other'))
+
+
+class LoadTestCommandsTests(TestCase):
+
+    def test_generate_and_benchmark(self):
+        """Генератор создаёт данные, бенчмарк отчитывается и не пишет."""
+        call_command('generate_data', users=5, groups=2, posts=30,
+                     comments=20, follows=10, seed=1, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertEqual(Post.objects.filter(
+            pub_date__lt=Post.objects.latest('pub_date').pub_date).count(),
+            29)
+        posts = Post.objects.count()
+        out = StringIO()
+        call_command('benchmark', requests=2, warmup=0, seed=1, stdout=out,
+                     stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['scenarios']), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment'})
+        self.assertEqual(report['scenarios']['index']['status'], {'200': 2})
+        self.assertEqual(report['scenarios']['post_create']['status'],
+                         {'302': 2})
+        self.assertEqual(Post.objects.count(), posts)
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.title = Post.objects.create(
+            author=cls.user, text='Ёлка <b>зелёная</b> в лесу')
+        cls.commented = Post.objects.create(
+            author=cls.user, text='Про прогулку')
+        Comment.objects.create(post=cls.commented, author=cls.user,
+                               text='Видели ёлку у дороги')
+        Post.objects.create(author=cls.user, text='Про другое')
+
+    def search(self, query):
+        return self.client.get(reverse('posts:search'), {'q': query})
+
+    def test_ranked_with_highlight(self):
+        """Пост с совпадением в тексте выше, чем в комментариях."""
+        response = self.search('ёлк')
+        posts = list(response.context['page_obj'])
+        self.assertEqual(posts, [self.title, self.commented])
+        self.assertIn('<mark>Ёлка</mark>', posts[0].snippet)
+        self.assertIn('&lt;b&gt;', posts[0].snippet)
+
+    def test_index_follows_changes(self):
+        """Индекс следует за правкой и удалением поста и комментария."""
+        Comment.objects.filter(post=self.commented).delete()
+        self.assertEqual(list(self.search('ёлку').context['page_obj']), [])
+        post = Post.objects.get(pk=self.title.pk)
+        post.text = 'Сосна'
+        post.save()
+        self.assertEqual(list(self.search('сосна').context['page_obj']),
+                         [post])
+        post.delete()
+        self.assertEqual(self.search('сосна').context['page_obj']
+                         .paginator.count, 0)
+
+    def test_rebuild_and_syntax(self):
+        """Пересборка индекса; операторы FTS5 из запроса не выполняются."""
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(
+            self.search('про OR "NOT').context['page_obj'].paginator.count,
+            0)
+        self.assertEqual(self.search('').context['page_obj'].paginator.count,
+                         0)
+
+
+class ImportTests(TestCase):
+
+    def setUp(self):
+        # Вне дерева исходников, чтобы файлы теста не попали в репозиторий.
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_ndjson_and_csv(self):
+        """Импорт со ссылками между записями и исходными датами."""
+        users = self.write('users.csv', 'username,first_name\nauth,Лев\n'
+                                        'reader,Анна\nauth,Дубль\n')
+        records = [
+            {'type': 'group', 'slug': 'legacy', 'title': 'Старая'},
+            {'type': 'post', 'id': 7, 'author': 'auth', 'group': 'legacy',
+             'text': 'Старый пост', 'pub_date': '2015-03-01T10:00:00+00:00'},
+            {'type': 'comment', 'post': 7, 'author': 'reader',
+             'text': 'Старый комментарий', 'created': '2015-03-02T10:00:00'},
+            {'type': 'follow', 'user': 'reader', 'author': 'auth'},
+            {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+        ]
+        data = self.write('data.ndjson', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records))
+        out = StringIO()
+        call_command('import_data', users, '--type', 'user', stdout=out)
+        call_command('import_data', data, batch_size=2, stdout=out)
+        self.assertIn('пропущено записей: 1', out.getvalue())
+        post = Post.objects.get()
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group.slug, 'legacy')
+        self.assertEqual(post.author.first_name, 'Лев')
+        comment = Comment.objects.get()
+        self.assertEqual((comment.post, comment.created.day), (post, 2))
+        self.assertEqual(post.comments_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(list(FeedItem.objects.filter(user=reader)
+                              .values_list('post', flat=True)), [post.id])
+        self.client.force_login(reader)
+        response = self.client.get(reverse('posts:search'), {'q': 'старый'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        new = Post.objects.create(author=reader, text='Новый пост')
+        self.assertGreater(new.id, post.id)
+
+    def test_bad_date_is_skipped(self):
+        """Дата вне диапазона пропускает запись, а не прерывает импорт."""
+        User.objects.create_user(username='auth')
+        records = [
+            {'type': 'post', 'author': 'auth', 'text': 'Плохая дата',
+             'pub_date': '2020-13-45T00:00:00'},
+            {'type': 'post', 'author': 'auth', 'text': 'Хорошая дата'},
+        ]
+        data = self.write('data.ndjson', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records))
+        out = StringIO()
+        call_command('import_data', data, stdout=out)
+        self.assertIn('пропущено записей: 1', out.getvalue())
+        self.assertEqual(list(Post.objects.values_list('text', flat=True)),
+                         ['Хорошая дата'])
+
+    def test_refresh_only_touched(self):
+        """Импорт пересчитывает затронутое, --rebuild — всё."""
+        old = User.objects.create_user(username='old')
+        Post.objects.create(author=old, text='Пост до импорта')
+        name = counters.author_posts(old.id)
+        counters.get(name)
+        Counter.objects.filter(name=name).update(value=42)
+        records = [
+            {'type': 'user', 'username': 'auth'},
+            {'type': 'post', 'author': 'auth', 'text': 'Новый пост'},
+        ]
+        data = self.write('data.ndjson', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records))
+        call_command('import_data', data, stdout=StringIO())
+        auth = User.objects.get(username='auth')
+        self.assertEqual(counters.get(counters.author_posts(auth.id)), 1)
+        self.assertEqual(counters.get(counters.POSTS), 2)
+        self.assertEqual(counters.get(name), 42)
+        call_command('import_data', data, rebuild=True, stdout=StringIO())
+        self.assertEqual(counters.get(name), 1)
+
+
+class FollowEndpointTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, name, username='writer'):
+        return self.client.post(
+            reverse(f'posts:{name}', kwargs={'username': username}),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка и отписка ничего не ломают и отдают JSON."""
+        self.assertEqual(self.post('profile_follow').json(), {
+            'author': 'writer', 'following': True, 'changed': True,
+            'followers': 1})
+        self.assertFalse(self.post('profile_follow').json()['changed'])
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.post('profile_unfollow').json(), {
+            'author': 'writer', 'following': False, 'changed': True,
+            'followers': 0})
+        self.assertFalse(self.post('profile_unfollow').json()['changed'])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_repeat_follow_single_statement(self):
+        """Повторная подписка — один INSERT без предварительных SELECT."""
+        self.post('profile_follow')
+        with CaptureQueriesContext(connection) as queries:
+            self.post('profile_follow')
+        follow_queries = [query['sql'] for query in queries
+                          if '"posts_follow"' in query['sql']]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertTrue(follow_queries[0].startswith('INSERT'))
+
+    def test_errors(self):
+        """Подписка на себя и на неизвестного — ошибки в JSON."""
+        self.assertEqual(self.post('profile_follow', 'reader').status_code,
+                         400)
+        self.assertEqual(self.post('profile_follow', 'nobody').status_code,
+                         404)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_form_post_redirects(self):
+        """Обычная форма без JavaScript получает переход на профиль."""
+        response = self.client.post(
+            reverse('posts:profile_follow', kwargs={'username': 'writer'}))
+        self.assertRedirects(response, reverse(
+            'posts:profile', kwargs={'username': 'reader'}))
+        self.assertTrue(Follow.objects.filter(user=self.user).exists())
@@ -0,0 +1,16 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что страница укладывается в фиксированное число запросов."""
+
+    def assertQueryBudget(self, client, url, budget):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{url}: {len(context)} запросов при бюджете {budget}:\n'
+            f'{queries}')
+        return response
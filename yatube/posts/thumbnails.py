@@ -0,0 +1,40 @@
+"""
+Миниатюры постов генерируются заранее, после сохранения картинки.
+
+Задача очереди (core.tasks) строит все размеры из THUMBNAIL_GEOMETRIES и
+сохраняет URL миниатюры карточки в Post.thumbnail; шаблоны выводят его
+без обращения к движку sorl. Пока миниатюры нет, выводится оригинал.
+"""
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import enqueue
+
+from . import versions
+from .models import Post
+
+TASK = 'posts.thumbnails'
+
+
+def generate(post_id, name):
+    """Построить миниатюры картинки name поста; вернуть URL карточки."""
+    post = Post.objects.only('id', 'image', 'author_id', 'group_id').get(
+        id=post_id)
+    if post.image.name != name:
+        return None
+    url = ''
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES.items():
+        thumbnail = get_thumbnail(post.image, geometry, **options)
+        if geometry == settings.POST_CARD_THUMBNAIL:
+            url = thumbnail.url
+    Post.objects.filter(id=post_id, image=name).update(thumbnail=url)
+    # Карточка изменилась и в лентах: их ETag и кэш страниц тоже.
+    versions.bump(f'post:{post_id}',
+                  *versions.feed_scopes(post.author_id, post.group_id))
+    return url
+
+
+def schedule(post):
+    """Поставить построение миниатюр в очередь; видно после фиксации."""
+    post_id, name = post.pk, post.image.name
+    enqueue(TASK, post_id, name, key=f'{TASK}:{post_id}:{name}')
@@ -0,0 +1,129 @@
+"""
+Проверка картинок, пока загрузка ещё идёт.
+
+ImageUploadHandler стоит первым в FILE_UPLOAD_HANDLERS. Для полей из
+IMAGE_UPLOAD_FIELDS он читает заголовок картинки из первых байтов и
+считает объём. Слишком большой файл, не-картинка или картинка с
+огромными размерами отклоняются сразу: остаток потока не передаётся
+следующим обработчикам и не копится ни в памяти, ни на диске. Вместо
+файла форма получает RejectedUpload с причиной отказа.
+"""
+import os
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+# Форматы, которые отдаются браузерам как есть; остальные перекодируются.
+WEB_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Служебные данные, без которых картинка отрисуется иначе.
+KEEP_INFO = {'transparency', 'duration', 'loop', 'background'}
+
+
+class RejectedUpload(UploadedFile):
+    """Отклонённый при загрузке файл: только имя и причина."""
+
+    def __init__(self, name, reason):
+        super().__init__(BytesIO(), name=name, size=0)
+        self.reason = reason
+
+
+def check_dimensions(width, height):
+    """Причина отказа для картинки width x height или None."""
+    if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+        return (f'Картинка больше {settings.IMAGE_MAX_DIMENSION} '
+                f'точек по стороне')
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        return 'Слишком много точек в картинке'
+    return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.watching = field_name in settings.IMAGE_UPLOAD_FIELDS
+        self.received = 0
+        self.header = b''
+        self.checked = False
+        self.reason = None
+
+    def reject(self, reason):
+        self.reason = reason
+        self.header = b''
+
+    def inspect(self, raw_data):
+        self.header += raw_data
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            return self.reject('Слишком много точек в картинке')
+        except Exception:
+            if len(self.header) >= settings.IMAGE_HEADER_MAX_BYTES:
+                self.reject('Загрузите правильное изображение')
+            return None
+        self.checked = True
+        self.header = b''
+        reason = check_dimensions(width, height)
+        if reason:
+            self.reject(reason)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.watching:
+            return raw_data
+        if self.reason is None:
+            self.received += len(raw_data)
+            if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+                limit = settings.IMAGE_UPLOAD_MAX_SIZE // 2 ** 20
+                self.reject(f'Файл больше {limit} МБ')
+            elif not self.checked:
+                self.inspect(raw_data)
+        if self.reason is not None:
+            # Следующие обработчики ничего не получат.
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.watching and self.reason is None and not self.checked:
+            self.reject('Загрузите правильное изображение')
+        if self.watching and self.reason is not None:
+            return RejectedUpload(self.file_name, self.reason)
+        return None
+
+
+def normalize_image(upload):
+    """
+    Перекодировать загруженную картинку без метаданных (EXIF, ICC).
+
+    Поворот из EXIF применяется к точкам. Форматы не из WEB_FORMATS
+    сохраняются в PNG (с прозрачностью) или JPEG.
+    """
+    upload.seek(0)
+    with Image.open(upload) as source:
+        reason = check_dimensions(*source.size)
+        if reason:
+            raise forms.ValidationError(reason)
+        image_format = source.format
+        animated = getattr(source, 'is_animated', False)
+        image = source if animated else ImageOps.exif_transpose(source)
+        if image_format not in WEB_FORMATS:
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image_format = 'PNG' if has_alpha else 'JPEG'
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.info = {key: value for key, value in image.info.items()
+                      if key in KEEP_INFO}
+        options = {'save_all': True} if animated else {}
+        if image_format == 'JPEG':
+            options.update(quality=85, optimize=True)
+        output = BytesIO()
+        image.save(output, image_format, **options)
+    name = upload.name
+    if source.format != image_format:
+        name = f'{os.path.splitext(name)[0]}.{WEB_FORMATS[image_format]}'
+    return SimpleUploadedFile(name, output.getvalue(),
+                              content_type=Image.MIME[image_format])
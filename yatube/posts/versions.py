@@ -0,0 +1,50 @@
+"""
+Версии содержимого для ключей кэша.
+
+Версия области (post:<id>, user:<id>, group:<id>, ...) — момент её
+последнего изменения. Ключи кэша включают версии, поэтому изменение
+области делает старые записи недостижимыми без явного удаления.
+Отсутствующая в кэше версия считается только что изменённой.
+
+Версии лент (feed, feed:author:<id>, feed:group:<id>) меняются при
+любом изменении их карточек, site — при редких общих изменениях
+(переименование пользователя или группы), followers:<id> — при подписке
+на автора или отписке. Из них строятся ETag страниц.
+"""
+import time
+
+from django.core.cache import cache
+
+SITE = 'site'
+FEED = 'feed'
+
+
+def _key(scope):
+    return f'version:{scope}'
+
+
+def get_many(scopes):
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def get(scope):
+    return get_many([scope])[scope]
+
+
+def bump(*scopes):
+    now = time.time()
+    cache.set_many({_key(scope): now for scope in scopes}, None)
+
+
+def feed_scopes(author_id, group_id):
+    """Ленты, в которых выводится карточка поста."""
+    scopes = [FEED, f'feed:author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'feed:group:{group_id}')
+    return scopes
@@ -1,62 +1,158 @@
+from django.conf import settings
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
 from django.shortcuts import redirect
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_http_methods
 
-from .models import Post, Group, User, Follow
+from core.replicas import pin, replica_reads
+from core.tasks import enqueue
+
+from . import authors, counters, export, follows, groups, versions
+from .conditional import anonymous_page_cache, conditional
+from .models import Post, Group, User
+from .feed import follow_feed
 from .forms import PostForm, CommentForm
+from .fragments import render_cards
+from .paginator import CountedPaginator, CursorPaginator, paginate
+from .search import SearchResults
+from .tasks import NOTIFY_COMMENT, NOTIFY_FOLLOWER
+
+# Параметр курсора комментариев на странице поста.
+COMMENTS_PARAM = 'comments'
+
+
+def _viewer_scopes(request):
+    """Отметки подписок в карточках зависят от подписок читателя."""
+    if request.user.is_authenticated:
+        return [f'follows:{request.user.pk}']
+    return []
+
+
+def _index_scopes(request):
+    return [versions.FEED, *_viewer_scopes(request)]
+
+
+def _group_scopes(request, slug):
+    group = groups.get_by_slug(slug)
+    if group is None:
+        return None
+    return [f'feed:group:{group.id}', *_viewer_scopes(request)]
+
+
+def _profile_scopes(request, username):
+    summary = authors.get_by_username(username)
+    if summary is None:
+        return None
+    return [f'feed:author:{summary["id"]}', f'followers:{summary["id"]}',
+            f'follows:{summary["id"]}', f'follows:{request.user.pk}']
+
 
+def _post_scopes(request, post_id):
+    author_id = Post.objects.filter(id=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [f'post:{post_id}', f'feed:author:{author_id}',
+            f'followers:{author_id}']
 
+
+@replica_reads
+@conditional(_index_scopes)
+@anonymous_page_cache(_index_scopes)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.select_related('group').all()
-    paginator = Paginator(posts, settings.PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    page_obj = paginate(request, posts,
+                        count=lambda: counters.get(counters.POSTS))
+    render_cards(page_obj)
+    follows.mark_followed(request.user, page_obj)
     context = {'page_obj': page_obj,
                }
     return render(request, template, context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = CountedPaginator(SearchResults(query), settings.PAGE_COUNT)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.page_window = paginator.window(page_obj.number)
+    context = {'page_obj': page_obj,
+               'query': query,
+               }
+    return render(request, 'posts/search.html', context)
+
+
+@replica_reads
+@conditional(_group_scopes)
+@anonymous_page_cache(_group_scopes)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = groups.get_by_slug(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    posts = group.posts.for_feed()
+    page_obj = paginate(request, posts, count=lambda: counters.get(
+        counters.group_posts(group.id)))
+    render_cards(page_obj)
+    follows.mark_followed(request.user, page_obj)
     context = {'page_obj': page_obj,
                'group': group,
                }
     return render(request, template, context)
 
 
+@replica_reads
+@conditional(_profile_scopes)
+@anonymous_page_cache(_profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    else:
-        following = False
-    paginator = Paginator(posts, settings.PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    summary = authors.get_by_username(username)
+    if summary is None:
+        raise Http404('Пользователь не найден')
+    author = authors.user(summary)
+    posts = author.posts.for_feed()
+    following = follows.is_following(request.user, author.id)
+    posts_count = summary['posts_count']
+    page_obj = paginate(request, posts, count=posts_count)
+    render_cards(page_obj, 'includes/profile_post.html')
+    suggested = []
+    if author == request.user:
+        ids = follows.suggestions(request.user)
+        summaries = authors.get_many(ids)
+        suggested = [summaries[author_id] for author_id in ids
+                     if author_id in summaries]
     context = {'author': author,
                'page_obj': page_obj,
                'following': following,
+               'posts_count': posts_count,
+               'followers_count': summary['followers_count'],
+               'following_count': summary['following_count'],
+               'suggested': suggested,
                }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@conditional(_post_scopes)
+@anonymous_page_cache(_post_scopes)
 def post_detail(request, post_id):
-    post_id = get_object_or_404(Post, id=post_id)
-    comments = post_id.comments.all()
+    post_id = get_object_or_404(Post.objects.for_feed(), id=post_id)
+    paginator = CursorPaginator(post_id.comments.all(),
+                                settings.COMMENTS_PER_PAGE,
+                                ordering=('-created', '-id'))
+    comments = paginator.get_page(request.GET.get(COMMENTS_PARAM))
+    # Авторы поста и комментариев — одним чтением сводок.
+    summaries = authors.get_many(
+        [post_id.author_id, *(comment.author_id for comment in comments)])
+    authors.attach(comments, summaries=summaries)
+    summary = summaries[post_id.author_id]
     form = CommentForm()
     context = {'post': post_id,
                'form': form,
                'comments': comments,
+               'author_posts_count': summary['posts_count'],
+               'author_followers_count': summary['followers_count'],
                }
     return render(request, 'posts/post_detail.html', context)
 
@@ -96,35 +192,88 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        enqueue(NOTIFY_COMMENT, comment.id)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    post_list_follow = Post.objects.filter(
-        author__following__user=request.user)
-    paginator = Paginator(post_list_follow, settings.PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list_follow = follow_feed(request.user).for_feed()
+    page_obj = paginate(request, post_list_follow)
+    render_cards(page_obj)
     context = {'page_obj': page_obj,
                }
     return render(request, 'posts/follow.html', context)
 
 
+def _change_follow(request, username, change, following):
+    """
+    Подписка или отписка одним оператором SQL. Асинхронный клиент
+    (POST с X-Requested-With или Accept: application/json) получает JSON,
+    остальные — переход на профиль, как раньше.
+    """
+    wants_json = request.method == 'POST' and (
+        request.is_ajax()
+        or 'application/json' in request.META.get('HTTP_ACCEPT', ''))
+    summary = authors.get_by_username(username)
+    if summary is None:
+        if wants_json:
+            return JsonResponse({'error': 'Пользователь не найден'},
+                                status=404)
+        raise Http404('Пользователь не найден')
+    if summary['id'] == request.user.pk:
+        if wants_json:
+            return JsonResponse({'error': 'Нельзя подписаться на себя'},
+                                status=400)
+        return redirect('posts:profile', request.user)
+    pin(request)
+    changed = change(request.user.pk, summary['id'])
+    if changed and following:
+        enqueue(NOTIFY_FOLLOWER, request.user.pk, summary['id'],
+                key=f'{NOTIFY_FOLLOWER}:{request.user.pk}:{summary["id"]}')
+    if not wants_json:
+        return redirect('posts:profile', request.user)
+    return JsonResponse({
+        'author': username,
+        'following': following,
+        'changed': changed,
+        'followers': authors.get(summary['id'])['followers_count'],
+    })
+
+
 @login_required
+@require_http_methods(['GET', 'POST'])
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    already = Follow.objects.filter(user=request.user, author=author).exists()
-    if request.user.username == username:
-        return redirect('posts:profile', request.user)
-    if not already:
-        Follow.objects.get_or_create(user=request.user, author=author)
-    return redirect('posts:profile', request.user)
+    return _change_follow(request, username, follows.follow, True)
 
 
 @login_required
+@require_http_methods(['GET', 'POST'])
 def profile_unfollow(request, username):
-    following = get_object_or_404(User, username=username)
-    follower = get_object_or_404(Follow, author=following, user=request.user)
-    follower.delete()
-    return redirect('posts:profile', request.user)
+    return _change_follow(request, username, follows.unfollow, False)
+
+
+@login_required
+def export_posts(request):
+    author = group = None
+    # Выгрузка всей базы целиком — только для персонала.
+    if not (request.GET.get('author') or request.GET.get('group')
+            or request.user.is_staff):
+        return HttpResponseBadRequest('Укажите автора (author) или группу '
+                                      '(group) для выгрузки.')
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    output_format = request.GET.get('format', 'ndjson')
+    if output_format not in export.FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    rows = export.records(author, group,
+                          comments=request.GET.get('comments') == '1')
+    response = StreamingHttpResponse(
+        export.buffered(export.serialize(rows, output_format)),
+        content_type=export.CONTENT_TYPES[output_format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="posts.{output_format}"')
+    return response
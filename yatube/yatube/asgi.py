@@ -0,0 +1,19 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 has no ASGI handler: core.asgi.WSGIBridge serves the WSGI
+application from a bounded thread pool (ASGI_THREADS) and does client I/O
+on the event loop.
+
+    uvicorn yatube.asgi:application
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from core.asgi import WSGIBridge  # noqa: E402
+
+application = WSGIBridge(get_wsgi_application())
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -58,7 +60,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,9 +85,41 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, а не открывается на каждый.
+        'CONN_MAX_AGE': 60,
+        # Сколько секунд ждать блокировку записи (sqlite3.connect).
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# Потоков для представлений в ASGI-точке входа (yatube/asgi.py).
+ASGI_THREADS = 16
+
+# Реплики только для чтения для лент (core.replicas), через запятую:
+# YATUBE_REPLICAS=/var/lib/yatube/replica1.sqlite3,... Локально их
+# обновляет команда sync_replicas. В тестах реплики зеркалят default.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('YATUBE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 15
+# Наибольшее ожидаемое отставание реплик: более свежие изменения
+# читаются из основной базы.
+REPLICA_MAX_LAG = 5
+
+# Прагмы новых соединений SQLite (core.sqlite), поверх значений
+# по умолчанию: WAL, synchronous=NORMAL, busy_timeout, кэш и mmap.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -123,6 +157,16 @@ EMPTY_VALUE = '-пусто-'
 
 PAGE_COUNT = 10
 
+COMMENTS_PER_PAGE = 20
+
+# 'offset' — номера страниц (?page=N), 'cursor' — keyset-пагинация
+# (?cursor=...). Параметр ?cursor в запросе включает её для одной ленты.
+PAGINATION_MODE = 'offset'
+
+# Посты авторов с таким числом подписчиков не раскладываются по лентам
+# подписок, а подтягиваются при чтении. None — раскладывать всегда.
+FEED_CELEBRITY_FOLLOWERS = 1000
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
@@ -133,6 +177,18 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Картинки проверяются потоково, ещё во время загрузки.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploadhandlers.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_FIELDS = ('image',)
+IMAGE_UPLOAD_MAX_SIZE = 10 * 2 ** 20
+IMAGE_HEADER_MAX_BYTES = 256 * 2 ** 10
+IMAGE_MAX_DIMENSION = 6000
+IMAGE_MAX_PIXELS = 24 * 10 ** 6
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -142,8 +198,56 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Сколько последних замеров каждого представления хранит процесс.
+QUERY_METRICS_BUFFER = 1000
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Общий для всех воркеров кэш в файле SQLite:
+# YATUBE_SHARED_CACHE=/var/tmp/yatube-cache.sqlite3
+if os.environ.get('YATUBE_SHARED_CACHE'):
+    CACHES['default'] = {
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.environ['YATUBE_SHARED_CACHE'],
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_BYTES': 256 * 2 ** 20,
+        },
+    }
+
+# Миниатюры строятся фоновой задачей после сохранения картинки.
+POST_CARD_THUMBNAIL = '960x339'
+THUMBNAIL_GEOMETRIES = {
+    POST_CARD_THUMBNAIL: {'crop': 'center', 'upscale': True},
+}
+
+# Фоновые задачи (core.tasks); выполняет команда run_tasks.
+TASK_WORKERS = 2
+TASK_POLL_INTERVAL = 1
+TASK_MAX_ATTEMPTS = 5
+# Пауза перед повтором, удваивается с каждой попыткой.
+TASK_RETRY_DELAY = 10
+# Задача в работе дольше этого считается брошенной упавшим обработчиком.
+TASK_TIMEOUT = 10 * 60
+
+# Карточки постов инвалидируются версиями, таймаут лишь чистит мусор.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Условные GET, кэш страниц для анонимов и кэш карточек держатся на
+# версиях областей (posts.versions) в кэше default. Нужен кэш, общий для
+# всех воркеров: с LocMemCache у каждого процесса свои версии, изменение
+# в одном не видно другим, и они отдают устаревшие 304 и страницы. Без
+# общего кэша эти возможности включены только в отладке (один процесс);
+# включённые вручную — предупреждение проверки posts.W001.
+SHARED_CACHE = (CACHES['default']['BACKEND']
+                != 'django.core.cache.backends.locmem.LocMemCache')
+CONDITIONAL_GET = DEBUG or SHARED_CACHE
+POST_CARD_CACHE = DEBUG or SHARED_CACHE
+# Кэш готовых страниц лент и постов для анонимов. В отладке выключен:
+# ответ из кэша не несёт context для тестового клиента.
+ANONYMOUS_PAGE_CACHE = not DEBUG and SHARED_CACHE
+PAGE_CACHE_TIMEOUT = 60 * 10